@@ -0,0 +1,260 @@
+# api.py
+"""
+Headless JSON API over the same data layer the Streamlit page uses.
+
+    python api.py            # listens on API_HOST:API_PORT (default 127.0.0.1:8502)
+
+Endpoints (all GET):
+    /health
+    /companies                               company directory
+    /companies/<id>?limit=N&sections=...     bundle: news, results, brokers
+    /companies/<id>/news|results|brokers     one section
+    /bulk?ids=A,B,C&section=results          one section for many companies
+
+<id> is the NSE symbol, ISIN, BSE code or company name (see data.CompanyDirectory).
+Responses carry a weak ETag hashed from the JSON body (so any edit to a returned doc
+changes it, and it holds for the gzip and identity encodings alike), honour
+If-None-Match (304), set Cache-Control, and are gzip'd when the client accepts it.
+Rendered bodies sit in a process-wide TTL cache shared by all handler threads.
+"""
+import os, json, gzip, hashlib, hmac, ipaddress
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, List, Tuple
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from data import (
+    BREAKER_RESET_S, TTLCache, Company, SourceUnavailable, get_company_directory,
+    peek_company_directory, find_company,
+    fetch_actual_docs, fetch_preview_doc, fetch_preview_doc_query,
+    resolve_actuals, broker_rows, results_rows,
+)
+
+# -------------------- CONFIG --------------------
+API_HOST      = os.getenv("API_HOST", "127.0.0.1")
+API_PORT      = int(os.getenv("API_PORT", "8502"))
+API_TOKEN     = os.getenv("API_TOKEN", "")                 # empty -> no auth (loopback binds only)
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "60"))     # seconds; also Cache-Control max-age
+API_BULK_MAX  = int(os.getenv("API_BULK_MAX", "100"))
+GZIP_MIN_BYTES = 1024
+
+SECTIONS = ("news", "results", "brokers")
+
+_responses = TTLCache(ttl=API_CACHE_TTL)
+
+# -------------------- DIRECTORY --------------------
+def resolve_company(cid: str) -> Optional[Company]:
+    # Until /companies has built the directory, resolve single companies with one indexed read.
+    directory = peek_company_directory()
+    return directory.lookup(cid) if directory is not None else find_company(cid)
+
+# -------------------- SECTIONS --------------------
+def _news(opt: Company, limit: int) -> Any:
+    return fetch_actual_docs(opt, limit=limit)
+
+def _results(opt: Company) -> Any:
+    q = fetch_preview_doc_query(opt)
+    preview = fetch_preview_doc(q) if q else None
+    if not preview:
+        return None
+    actual = resolve_actuals(q)
+    return {
+        "company_id": preview.get("company_id"),
+        "basis": actual.get("basis"),
+        "period_label": actual.get("period_label") or preview.get("report_period"),
+        "rows": results_rows(preview, actual),
+    }
+
+def _brokers(opt: Company) -> Any:
+    q = fetch_preview_doc_query(opt)
+    preview = fetch_preview_doc(q) if q else None
+    return broker_rows(preview) if preview else []
+
+def company_payload(opt: Company, sections, limit: int) -> Dict[str, Any]:
+    """One company's sections; a section whose source is down is null and listed under "errors"."""
+    out: Dict[str, Any] = {"id": opt.id, "company": opt.as_dict()}
+    for s in sections:
+        try:
+            if s == "news":      payload = _news(opt, limit)
+            elif s == "results": payload = _results(opt)
+            else:                payload = _brokers(opt)
+        except SourceUnavailable as e:
+            out.setdefault("errors", {})[s] = str(e)
+            payload = None
+        out[s] = payload
+    return out
+
+# -------------------- RESPONSE CACHE --------------------
+class _Rendered:
+    __slots__ = ("status", "body", "etag", "cacheable", "_gz")
+
+    def __init__(self, status: int, obj: Any, degraded: bool = False):
+        self.status = status
+        # degraded responses (a source was down) are served but never cached or revalidated
+        self.cacheable = status == 200 and not degraded
+        self.body = json.dumps(obj, default=str, ensure_ascii=False).encode("utf-8")
+        # weak: the same validator covers the identity and gzip encodings of this body
+        self.etag = 'W/"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self._gz = None
+
+    def gzipped(self) -> bytes:
+        if self._gz is None:
+            self._gz = gzip.compress(self.body, compresslevel=5)
+        return self._gz
+
+def _parse_limit(qs: Dict[str, List[str]]) -> int:
+    try: return max(1, min(50, int((qs.get("limit") or ["20"])[0])))
+    except: return 20
+
+def _parse_sections(qs: Dict[str, List[str]], key: str = "sections") -> Optional[Tuple[str, ...]]:
+    raw = ",".join(qs.get(key) or [])
+    if not raw:
+        return SECTIONS
+    wanted = tuple(s for s in (x.strip().lower() for x in raw.split(",")) if s)
+    return wanted if all(s in SECTIONS for s in wanted) else None
+
+def render(path: str, qs: Dict[str, List[str]]) -> _Rendered:
+    parts = [unquote(p) for p in path.strip("/").split("/") if p]
+
+    if parts == ["health"]:
+        return _Rendered(200, {"ok": True})
+
+    if parts == ["companies"]:
+        return _Rendered(200, [c.as_dict() for c in get_company_directory()])
+
+    if parts and parts[0] == "companies" and len(parts) in (2, 3):
+        opt = resolve_company(parts[1])
+        if not opt:
+            return _Rendered(404, {"error": f"unknown company '{parts[1]}'"})
+        if len(parts) == 3:
+            if parts[2] not in SECTIONS:
+                return _Rendered(404, {"error": f"unknown section '{parts[2]}'"})
+            sections = (parts[2],)
+        else:
+            sections = _parse_sections(qs)
+            if sections is None:
+                return _Rendered(400, {"error": f"sections must be a subset of {','.join(SECTIONS)}"})
+        payload = company_payload(opt, sections, _parse_limit(qs))
+        degraded = "errors" in payload
+        if len(parts) == 3:
+            if degraded:
+                return _Rendered(503, {"error": payload["errors"][parts[2]]})
+            payload = payload[parts[2]]
+        return _Rendered(200, payload, degraded)
+
+    if parts == ["bulk"]:
+        ids = [i.strip() for i in ",".join(qs.get("ids") or []).split(",") if i.strip()]
+        if not ids:
+            return _Rendered(400, {"error": "ids is required"})
+        if len(ids) > API_BULK_MAX:
+            return _Rendered(400, {"error": f"at most {API_BULK_MAX} ids per request"})
+        sections = _parse_sections(qs, "section")
+        if sections is None:
+            return _Rendered(400, {"error": f"section must be a subset of {','.join(SECTIONS)}"})
+        limit = _parse_limit(qs)
+        out = {}
+        for cid in ids:
+            opt = resolve_company(cid)
+            out[cid] = company_payload(opt, sections, limit) if opt else None
+        return _Rendered(200, out, any(p and "errors" in p for p in out.values()))
+
+    return _Rendered(404, {"error": "not found"})
+
+def cached_render(path: str, query: str) -> _Rendered:
+    qs = parse_qs(query)
+    key = (path.rstrip("/") or "/", tuple(sorted((k, tuple(v)) for k, v in qs.items())))
+    hit = _responses.get(key)
+    if hit is None:
+        hit = render(path, qs)
+        if hit.cacheable:
+            _responses.set(key, hit)
+    return hit
+
+# -------------------- HTTP --------------------
+def _weak(tag: str) -> str:
+    """Opaque part of an entity tag, for If-None-Match's weak comparison."""
+    return tag.strip().removeprefix("W/")
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ResultsViewerAPI/1.0"
+
+    def log_message(self, fmt, *args):  # keep stdout quiet under load
+        pass
+
+    def _authorized(self) -> bool:
+        if not API_TOKEN:
+            return True
+        got = self.headers.get("Authorization", "")
+        return hmac.compare_digest(got, f"Bearer {API_TOKEN}")
+
+    def _send(self, r: _Rendered, head_only: bool = False):
+        inm = self.headers.get("If-None-Match", "")
+        if r.cacheable and inm and (inm.strip() == "*" or _weak(r.etag) in [_weak(t) for t in inm.split(",")]):
+            self.send_response(304)
+            self.send_header("ETag", r.etag)
+            self.send_header("Cache-Control", f"private, max-age={int(API_CACHE_TTL)}")
+            self.end_headers()
+            return
+
+        body = r.body
+        use_gz = len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gz:
+            body = r.gzipped()
+
+        self.send_response(r.status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gz:
+            self.send_header("Content-Encoding", "gzip")
+        if r.cacheable:
+            self.send_header("ETag", r.etag)
+            self.send_header("Cache-Control", f"private, max-age={int(API_CACHE_TTL)}")
+        else:
+            self.send_header("Cache-Control", "no-store")
+        if r.status == 503:
+            self.send_header("Retry-After", str(int(BREAKER_RESET_S)))
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def _handle(self, head_only: bool):
+        if not self._authorized():
+            return self._send(_Rendered(401, {"error": "unauthorized"}), head_only)
+        url = urlsplit(self.path)
+        try:
+            r = cached_render(url.path, url.query)
+        except SourceUnavailable as e:       # e.g. the directory itself could not be loaded
+            r = _Rendered(503, {"error": str(e)})
+        except Exception as e:
+            r = _Rendered(500, {"error": type(e).__name__})
+        self._send(r, head_only)
+
+    def do_GET(self):
+        self._handle(head_only=False)
+
+    def do_HEAD(self):
+        self._handle(head_only=True)
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try: return ipaddress.ip_address(host).is_loopback
+    except ValueError: return False
+
+def serve(host: str = API_HOST, port: int = API_PORT):
+    # the page is behind a login; never serve the same data unauthenticated off-host
+    if not API_TOKEN and not _is_loopback(host):
+        raise SystemExit(f"Refusing to listen on {host} without API_TOKEN; set one or bind to 127.0.0.1.")
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    print(f"Results Viewer API on http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+if __name__ == "__main__":
+    serve()
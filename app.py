@@ -1,29 +1,23 @@
 # app.py
-import os, json, re
-from datetime import datetime
-from typing import Any, Dict, Optional, List
+import os
+from typing import Any, Dict, List, Optional, Tuple
 
 import streamlit as st
-from pymongo import MongoClient
 import pandas as pd
-from dotenv import load_dotenv
 
-# -------------------- LOAD ENV (.env if present) --------------------
-load_dotenv()
+from data import (
+    REFDATA_TTL, _to_float_or_none, CompanyDirectory, SourceUnavailable, fetch_news_doc,
+    build_broker_df, results_rows, fetch_latest_news_by_company, Company,
+    get_company_directory, peek_company_directory, find_company, load_company_directory_in_background,
+)
+import consensus_history
+import prefetch
+import rollups
+import watchlists
 
 # -------------------- CONFIG --------------------
 st.set_page_config(page_title="Results Viewer", page_icon="📊", layout="wide")
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-DB_NAME   = os.getenv("DB_NAME", "RAG_CHATBOT")
-NEWS_COLL = os.getenv("NEWS_COLLECTION", "selected_ann")                # <- actual/announcement docs
-PREV_DB   = os.getenv("PREV_DB", "CAG_CHATBOT")                         # <- previews live here if separate DB
-PREV_COLL = os.getenv("PREV_COLLECTION", "company_result_previews")     # <- predicted results
-
-# Actuals source -> LatestCmotData
-ACTUAL_DB   = os.getenv("ACTUAL_DB", DB_NAME)                           # set ACTUAL_DB in .env if different
-ACTUAL_COLL = os.getenv("ACTUAL_COLLECTION", "LatestCmotData")
-
 APP_USER  = os.getenv("APP_USER", "admin")
 APP_PASS  = os.getenv("APP_PASS", "admin123")
 
@@ -66,6 +60,15 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# -------------------- WARM-UP --------------------
+# Once per process, on the first script run (the login page included): build the directory
+# and preload the most-viewed / recently announced companies in the background.
+@st.cache_resource
+def start_warm_up():
+    return prefetch.warm_up(get_company_directory)
+
+start_warm_up()
+
 # -------------------- AUTH --------------------
 if "is_authed" not in st.session_state:
     st.session_state.is_authed = False
@@ -84,6 +87,7 @@ def login_view():
         if u == APP_USER and p == APP_PASS:
             st.session_state.is_authed = True
             st.session_state.remember_me = remember
+            st.session_state.user = u
             st.rerun()
         else:
             st.error("Invalid credentials")
@@ -93,24 +97,7 @@ if not st.session_state.get("is_authed"):
     login_view()
     st.stop()
 
-# -------------------- DB --------------------
-client   = MongoClient(MONGO_URI)
-db_news  = client[DB_NAME]
-col_news = db_news[NEWS_COLL]
-db_prev  = client[PREV_DB] if PREV_DB else db_news
-col_prev = db_prev[PREV_COLL]
-db_actual = client[ACTUAL_DB]
-col_fin   = db_news[ACTUAL_COLL]
-
 # -------------------- HELPERS --------------------
-def _try_int(x):
-    try: return int(str(x).strip())
-    except: return None
-
-def _to_float_or_none(x):
-    try: return float(x)
-    except Exception: return None
-
 def fmt_money_cr(x):               # value in crores
     v = _to_float_or_none(x)
     return "-" if v is None else f"₹ {v:,.1f} cr"
@@ -123,324 +110,81 @@ def fmt_pct(x):
     v = _to_float_or_none(x)
     return "-" if v is None else f"{v:.1f} %"
 
-# Month mapping for period parsing
-_MONTHS = {"Jan":1,"Feb":2,"Mar":3,"Apr":4,"May":5,"Jun":6,"Jul":7,"Aug":8,"Sep":9,"Oct":10,"Nov":11,"Dec":12}
-
-def _period_to_dt(label: Optional[str]) -> datetime:
-    """
-    Parse 'Jun2025' or 'Jun-2025' -> datetime(2025,6,1)
-    """
-    if not label:
-        return datetime.min
-    m = re.match(r"([A-Za-z]{3})-?(\d{4})", str(label).strip())
-    if not m:
-        return datetime.min
-    mon = _MONTHS.get(m.group(1)[:3].title(), 1)
-    yr  = int(m.group(2))
-    return datetime(yr, mon, 1)
-
-def _parse_results_period_label(label: Optional[str]) -> datetime:
-    """Parse 'Quarter ended 30-Jun-2025' -> datetime(2025,6,30)."""
-    if not label:
-        return datetime.min
-    m = re.search(r'(\d{1,2})-([A-Za-z]{3})-(\d{4})', str(label))
-    if not m:
-        return datetime.min
-    day = int(m.group(1)); mon = _MONTHS.get(m.group(2)[:3].title(), 1); yr = int(m.group(3))
-    return datetime(yr, mon, day)
-
-def _to_crores(val, unit: Optional[str]) -> Optional[float]:
-    """
-    Normalize numeric to ₹ crores.
-    For LatestCmotData you already store 'unit': 'cr' -> factor 1.0 (safe no-op).
-    """
-    v = _to_float_or_none(val)
-    if v is None: return None
-    u = (unit or "").strip().lower()
-    if u in ("cr","crore","crores","₹ cr","inr cr"): factor = 1.0
-    elif u in ("mn","million","millions"): factor = 0.1
-    elif u in ("bn","billion","billions"): factor = 100.0
-    else: factor = 1.0
-    return v * factor
-
-# -------- Preview (predictions) --------
-def fetch_preview_doc(company_query: str) -> Optional[Dict[str, Any]]:
-    q = (company_query or "").strip()
-    if not q: return None
-    or_filters = [
-        {"company_id": q.upper()},
-        {"symbolmap.NSE": q.upper()},
-        {"company_display": {"$regex": q, "$options":"i"}},
-        {"company_key": {"$regex": q, "$options":"i"}},
-        {"symbolmap.Company_Name": {"$regex": q, "$options":"i"}},
-        {"company": q.upper()},  # ISIN exact
-    ]
-    if q.isdigit():
-        try: or_filters.append({"symbolmap.BSE": int(q)})
-        except: pass
-
-    docs = list(col_prev.find({"$or": or_filters}))
-    if not docs: return None
-
-    def keyer(d):
-        for k in ("updated_at","created_at"):
-            v = d.get(k)
-            if v:
-                try: return datetime.fromisoformat(str(v).replace("Z","+00:00"))
-                except: pass
-        return datetime.min
-
-    docs.sort(key=keyer, reverse=True)
-    return docs[0]
-
 def chip(text, kind=None):
     kind = kind or ""
     st.markdown(f'<span class="badge {kind}">{text}</span>', unsafe_allow_html=True)
 
-def build_broker_df(preview: Dict[str, Any]) -> pd.DataFrame:
-    def r1(x):
-        v = _to_float_or_none(x)
-        return round(v, 1) if v is not None else None
-
-    rows = []
-    for b in (preview.get("broker_estimates") or []):
-        pdf_name   = b.get("source_file") or b.get("report_id") or ""
-        source_url = b.get("source_url") or ""
-        rows.append({
-            "Broker": b.get("broker_name"),
-            "Published": (b.get("published_date","") or "")[:10],
-            "Expected Sales (₹ cr)":  r1(b.get("expected_sales")),
-            "Expected EBITDA (₹ cr)": r1(b.get("expected_ebitda")),
-            "Expected PAT (₹ cr)":    r1(b.get("expected_pat")),
-            "EBITDA Margin %":        r1(b.get("ebitda_margin_percent")),
-            "PAT Margin %":           r1(b.get("pat_margin_percent")),
-            "Commentary": b.get("commentary",""),
-            "PDF": source_url or pdf_name,
-        })
-
-    df = pd.DataFrame(rows)
-    for c in ["Expected Sales (₹ cr)","Expected EBITDA (₹ cr)","Expected PAT (₹ cr)",
-              "EBITDA Margin %","PAT Margin %"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce").round(1)
-    return df
-
-# -------- Actuals (LatestCmotData) extractors --------
-def _extract_from_latest_cmot(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """
-    LatestCmotData structure:
-      - doc["Consolidated"] or doc["Standalone"] is a dict of { "Jun2025": {...}, "actual": {"Jun2025": {... unit: 'cr'}} }
-    Prefer Consolidated; else Standalone.
-    Use 'actual' if present, else latest quarter key.
-    """
-    for basis in ("Consolidated", "Standalone"):
-        block = doc.get(basis)
-        if not isinstance(block, dict):
-            continue
-
-        # 1) Prefer 'actual' sub-block
-        actual_block = block.get("actual")
-        if isinstance(actual_block, dict) and actual_block:
-            # pick latest period from keys like "Jun2025"
-            period_keys = [k for k in actual_block.keys() if k and isinstance(k, str)]
-            period_keys.sort(key=lambda x: _period_to_dt(x), reverse=True)
-            sel_key = period_keys[0]
-            m = actual_block.get(sel_key) or {}
-            unit = m.get("unit")  # already 'cr'
-            sales  = _to_crores(m.get("net_sales"),  unit)
-            ebitda = _to_crores(m.get("ebitda"),     unit)
-            pat    = _to_crores(m.get("net_profit"), unit)
-            emarg  = _to_float_or_none(m.get("ebitda_margin"))
-            pmarg  = _to_float_or_none(m.get("pat_margin"))
-            return {
-                "basis": basis,
-                "period_label": sel_key,
-                "sales": sales,
-                "ebitda": ebitda,
-                "pat": pat,
-                "ebitda_margin_percent": emarg,
-                "pat_margin_percent": pmarg,
-            }
-
-        # 2) Fallback to latest quarter entry in the block (exclude the 'actual' key)
-        quarter_keys = [k for k in block.keys() if k != "actual" and isinstance(block.get(k), dict)]
-        if quarter_keys:
-            quarter_keys.sort(key=lambda x: _period_to_dt(x), reverse=True)
-            sel_key = quarter_keys[0]
-            m = block.get(sel_key) or {}
-            # assume values in crores already
-            sales  = _to_float_or_none(m.get("net_sales"))
-            ebitda = _to_float_or_none(m.get("ebitda") or m.get("operating_profit"))
-            pat    = _to_float_or_none(m.get("net_profit"))
-            emarg  = _to_float_or_none(m.get("ebitda_margin"))
-            pmarg  = _to_float_or_none(m.get("pat_margin"))
-            return {
-                "basis": basis,
-                "period_label": sel_key,
-                "sales": sales,
-                "ebitda": ebitda,
-                "pat": pat,
-                "ebitda_margin_percent": emarg,
-                "pat_margin_percent": pmarg,
-            }
-    return None
-
-# Backward-compat extractor (older 'results' schema) — kept for safety
-def _extract_from_results(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    res = (doc.get("results") or {})
-    cons = res.get("Consolidated") or []
-    stand = res.get("Standalone") or []
-    basis = arr = None
-    if cons: basis, arr = "Consolidated", cons
-    elif stand: basis, arr = "Standalone", stand
-    else: return None
-
-    def _key(it):
-        lbl = ((it.get("period") or {}).get("label")) or ""
-        return _parse_results_period_label(lbl)
-    arr_sorted = sorted(arr, key=_key, reverse=True)
-    item = arr_sorted[0]
-    metrics = (item.get("metrics") or {}); unit = metrics.get("unit")
-
-    sales_cr  = _to_crores(metrics.get("Sales"), unit)
-    ebitda_cr = _to_crores(metrics.get("EBITDA") or metrics.get("Ebitda") or metrics.get("EBITDA_Profit"), unit)
-    pat_cr    = _to_crores(metrics.get("PAT") or metrics.get("Net_Profit") or metrics.get("Profit_After_Tax"), unit)
-    emargin   = _to_float_or_none(metrics.get("EBITDA_Margin") or metrics.get("Ebitda_Margin") or metrics.get("EBITDA_Margin_%"))
-    pmargin   = _to_float_or_none(metrics.get("PAT_Margin") or metrics.get("PAT_Margin_%"))
-
-    if emargin is None and ebitda_cr and sales_cr:
-        emargin = (ebitda_cr / sales_cr) * 100.0
-    if pmargin is None and pat_cr and sales_cr:
-        pmargin = (pat_cr / sales_cr) * 100.0
-
-    period_label = ((item.get("period") or {}).get("label")) or (doc.get("period") or None)
-    return {
-        "basis": basis,
-        "period_label": period_label,
-        "sales": sales_cr,
-        "ebitda": ebitda_cr,
-        "pat": pat_cr,
-        "ebitda_margin_percent": emargin,
-        "pat_margin_percent": pmargin,
-    }
-
-def fetch_preview_doc_query(selected: Dict[str, Any]) -> Optional[str]:
-    return (
-        selected.get("nse")
-        or selected.get("isin")
-        or selected.get("name")
-        or (str(selected.get("bse")) if selected.get("bse") is not None else None)
-    )
-
-def fetch_actual_results(company_query: str,
-                         col_fin_handle,
-                         basis: Optional[str] = None,
-                         report_period: Optional[str] = None) -> Optional[Dict[str, Any]]:
+# ---------- Dropdown options (only companies that have news) ----------
+# data.get_company_directory: one read-only directory per process, shared by every session
+# and the API (cache_data would hand each session its own unpickled copy). Sessions keep only the ID.
+# Deep-linked companies use cache_resource for the same reason.
+@st.cache_resource(ttl=REFDATA_TTL)
+def get_linked_company(query: str) -> Optional[Company]:
+    return find_company(query)
+
+def resolve_directory(link: Optional[str]) -> Tuple[CompanyDirectory, bool]:
     """
-    Fetch actuals from LatestCmotData (preferred) with fallback to older 'results' schema.
+    (directory, complete). A deep link opened before the directory is built resolves its
+    company with one indexed read and gets a one-entry directory while the full one
+    loads in the background; everything else waits for the full directory.
     """
-    q = (company_query or "").strip()
-    if not q:
-        return None
-
-    or_filters = [
-        {"company_id": q.upper()},
-        {"symbolmap.NSE": q.upper()},
-        {"company": q.upper()},  # ISIN
-        {"company_display": {"$regex": q, "$options":"i"}},
-        {"company_key": {"$regex": q, "$options":"i"}},
-        {"symbolmap.Company_Name": {"$regex": q, "$options":"i"}},
-    ]
-    if q.isdigit():
-        try: or_filters.append({"symbolmap.BSE": int(q)})
-        except: pass
-
-    docs = list(col_fin_handle.find({"$or": or_filters}))
-    if not docs:
-        return None
-
-    def sort_key(d):
-        # Prefer updated_at if present
-        v = d.get("updated_at")
-        if v:
-            try: return (2, datetime.fromisoformat(str(v).replace("Z","+00:00")))
-            except: pass
-        return (0, datetime.min)
-
-    docs.sort(key=sort_key, reverse=True)
-    doc = docs[0]
-
-    # 1) LatestCmotData path
-    extracted = _extract_from_latest_cmot(doc)
-    if extracted:
-        return extracted
-
-    # 2) Fallback: older 'results' array style
-    extracted2 = _extract_from_results(doc)
-    if extracted2:
-        return extracted2
-
-    # 3) Final fallback: flat keys (rare)
-    def _deep_get(d: Any, key: str) -> Optional[Any]:
-        if not isinstance(d, dict): return None
-        if key in d: return d[key]
-        for v in d.values():
-            if isinstance(v, dict):
-                got = _deep_get(v, key)
-                if got is not None: return got
-        return None
-
-    def _pick_any(doc_: Dict[str, Any], candidates) -> Optional[Any]:
-        for k in candidates:
-            v = _deep_get(doc_, k)
-            if v is not None: return v
-        return None
-
-    sales   = _pick_any(doc, ["actual_sales","sales","net_sales","revenue","total_income"])
-    ebitda  = _pick_any(doc, ["actual_ebitda","ebitda","operating_profit"])
-    pat     = _pick_any(doc, ["actual_pat","pat","net_profit","profit_after_tax","net_profit"])
-    e_marg  = _pick_any(doc, ["ebitda_margin_percent","ebitda_margin"])
-    p_marg  = _pick_any(doc, ["pat_margin_percent","pat_margin"])
-    return {
-        "basis": doc.get("basis"),
-        "period_label": doc.get("period"),
-        "sales": _to_float_or_none(sales),
-        "ebitda": _to_float_or_none(ebitda),
-        "pat": _to_float_or_none(pat),
-        "ebitda_margin_percent": _to_float_or_none(e_marg),
-        "pat_margin_percent": _to_float_or_none(p_marg),
-    }
-
-# ---------- Dropdown options (only companies that have news) ----------
-@st.cache_data(ttl=600)
-def get_company_options() -> List[Dict[str, Any]]:
-    pipeline = [
-        {"$group": {"_id": {
-            "nse": "$symbolmap.NSE",
-            "bse": "$symbolmap.BSE",
-            "name": "$symbolmap.Company_Name",
-            "isin": "$company"
-        }, "count": {"$sum": 1}}},
-        {"$sort": {"_id.name": 1}}
-    ]
-    items = list(col_news.aggregate(pipeline))
-    out = []
-    for it in items:
-        _id = it["_id"] or {}
-        nse = _id.get("nse"); bse = _id.get("bse"); name = _id.get("name"); isin = _id.get("isin")
-        label = f"{name or nse or isin or bse} — NSE {nse or '-'} | BSE {bse or '-'} | ISIN {isin or '-'}  ({it['count']})"
-        out.append({"label": label, "nse": nse, "bse": bse, "name": name, "isin": isin, "count": it["count"]})
-    return out
-
-# ---------- Fetch ALL news docs for selected company ----------
-def fetch_actual_docs(opt: Dict[str, Any], limit: int = 50) -> List[Dict[str, Any]]:
-    ors = []
-    if opt.get("nse"):  ors.append({"symbolmap.NSE": opt["nse"]})
-    if opt.get("bse"):  ors.append({"symbolmap.BSE": opt["bse"]})
-    if opt.get("isin"): ors.append({"company": opt["isin"]})
-    if opt.get("name"): ors.append({"symbolmap.Company_Name": opt["name"]})
-    if not ors: return []
-    return list(col_news.find({"$or": ors}).sort("dt_tm", -1).limit(limit))
+    full = peek_company_directory()
+    if full is not None:
+        return full, True
+    if link and not st.session_state.get("want_full_directory"):
+        company = get_linked_company(link.strip())
+        if company is not None:
+            load_company_directory_in_background()
+            return CompanyDirectory([company]), False
+    return get_company_directory(), True
+
+# ---------- Deep links: ?company=<ID / NSE / ISIN / BSE>&news=<1-50>&section=<news|results> ----------
+LINK_SECTIONS = ("all", "news", "results")
+
+def link_params() -> Tuple[Optional[str], Optional[int], str]:
+    qp = st.query_params
+    try: news = min(50, max(1, int(qp.get("news"))))
+    except (TypeError, ValueError): news = None
+    section = (qp.get("section") or "all").lower()
+    return qp.get("company") or None, news, section if section in LINK_SECTIONS else "all"
+
+# ---------- Sentiment / impact rollups (precomputed by rollups.py) ----------
+@st.cache_data(ttl=300)
+def get_sentiment_trend(company_id: str) -> List[Dict[str, Any]]:
+    return rollups.trend("company", company_id, grain="day", days=90)
+
+@st.cache_data(ttl=300)
+def get_most_negative_this_week() -> List[Dict[str, Any]]:
+    return rollups.most_negative("company", limit=10)
+
+# ---------- Consensus revision history (built by consensus_history.py) ----------
+@st.cache_data(ttl=300)
+def get_consensus_drift(company_query: str, report_period: str, days: int = 60) -> Dict[str, Any]:
+    return consensus_history.consensus_drift(company_query, report_period or None, days=days) or {}
+
+# ---------- Watchlist (persisted per user by watchlists.py) ----------
+def get_user_watchlist() -> List[str]:
+    """Watched company IDs, read from Mongo once per session and written through on change."""
+    if "watchlist" not in st.session_state:
+        try:
+            st.session_state.watchlist = watchlists.get_watchlist(st.session_state.get("user", APP_USER))
+        except SourceUnavailable:
+            return []
+    return st.session_state.watchlist
+
+def save_user_watchlist(company_ids: List[str]) -> bool:
+    try:
+        st.session_state.watchlist = watchlists.set_watchlist(st.session_state.get("user", APP_USER), company_ids)
+    except SourceUnavailable as e:
+        st.warning(f"Watchlist could not be saved right now ({e}). Try again shortly.")
+        return False
+    return True
+
+# Latest K announcements for every watched company, one aggregation per (watchlist, K).
+@st.cache_data(ttl=60)
+def get_watchlist_news(company_ids: tuple, k: int) -> List[Dict[str, Any]]:
+    directory = get_company_directory()
+    return fetch_latest_news_by_company([directory[c] for c in company_ids if c in directory], k)
 
 # ---------- Render a news card ----------
 def render_actual_card(doc: Dict[str, Any]):
@@ -504,90 +248,189 @@ def render_actual_card(doc: Dict[str, Any]):
         if live: st.markdown(f"- [Open Live PDF]({live})")
         if hist: st.markdown(f"- [Open Historical PDF]({hist})")
 
+    # Cards hold only the fields above; expander bodies run even when collapsed,
+    # so the full document is fetched only once the checkbox is ticked.
     with st.expander("Raw JSON"):
-        st.json(doc)
+        if st.checkbox("Load raw document", key=f"raw_{doc.get('_id')}"):
+            try:
+                st.json(fetch_news_doc(doc.get("_id")) or doc)
+            except SourceUnavailable as e:
+                st.warning(f"Raw document is temporarily unavailable ({e}).")
 
 # -------------------- UI --------------------
+link_company, link_news, link_section = link_params()
+
 with st.sidebar:
     st.markdown("### 🔍 Company (only those with news)")
-    options = get_company_options()
-    if not options:
+    try:
+        directory, directory_complete = resolve_directory(link_company)
+    except SourceUnavailable as e:
+        st.error(f"Company list is temporarily unavailable: {e}. Try again shortly.")
+        st.stop()
+    if not len(directory):
         st.error("No companies found in news collection.")
         st.stop()
 
-    default_max = min(20, max(1, options[0]["count"]))
+    default_max = link_news or min(20, max(1, directory[directory.ids[0]].count))
     max_items = st.slider("Max news to show", 1, 50, default_max, help="Show up to N latest news items")
-    selected = st.selectbox(
+    initial = directory.lookup(st.session_state.get("company_select") or link_company or "")
+    selected_id = st.selectbox(
         "Search & select",
-        options,
-        index=0,
-        format_func=lambda o: o["label"],
+        directory.ids,
+        index=directory.index_of(initial.id) if initial else 0,
+        format_func=lambda cid: directory[cid].label,
         key="company_select",
     )
+    selected = directory[selected_id]
+    if not directory_complete:
+        st.caption("Loading the full company list in the background…")
+        if st.button("Show all companies"):
+            st.session_state.want_full_directory = True
+            st.rerun()
+
+    watchlist = get_user_watchlist()
+    if selected.id in watchlist:
+        if st.button("★ Remove from watchlist") and save_user_watchlist([c for c in watchlist if c != selected.id]):
+            st.rerun()
+    elif st.button("☆ Add to watchlist") and save_user_watchlist(watchlist + [selected.id]):
+        st.rerun()
+    # fixed option values: a label that changed with the count would reset the radio on every edit
+    page = st.radio("Page", ["company", "watchlist"], horizontal=True, key="page",
+                    format_func=lambda p: f"Watchlist ({len(watchlist)})" if p == "watchlist" else "Company")
 
     st.caption(f"Showing up to {max_items} latest news items.")
     st.divider()
     if st.button("Logout"):
         st.session_state.is_authed = False
         st.session_state.remember_me = False
+        st.session_state.pop("watchlist", None)
+        st.session_state.pop("last_viewed", None)
         st.rerun()
 
+# ========== WATCHLIST PAGE ==========
+if page == "watchlist":
+    st.title("Watchlist")
+    directory = get_company_directory()
+    edited = st.multiselect("Watched companies", directory.ids, default=[c for c in watchlist if c in directory],
+                            format_func=lambda cid: directory[cid].label)
+    if edited != [c for c in watchlist if c in directory] and save_user_watchlist(edited):
+        st.rerun()
+    per_company = st.slider("Latest announcements per company", 1, 10, 3)
+    if not watchlist:
+        st.info("Your watchlist is empty. Add companies here or with ☆ in the sidebar.")
+        st.stop()
+    try:
+        groups = get_watchlist_news(tuple(watchlist), per_company)
+    except SourceUnavailable as e:
+        st.warning(f"News is temporarily unavailable ({e}).")
+        st.stop()
+    quiet = [c for c in watchlist if c in directory and c not in {g["_id"] for g in groups}]
+    for g in groups:
+        st.markdown(f"### {directory[g['_id']].name or g['_id'] if g['_id'] in directory else g['_id']}")
+        for doc in g["items"]:
+            render_actual_card(doc)
+        st.divider()
+    if quiet:
+        st.caption("No announcements: " + ", ".join(directory[c].name or c for c in quiet))
+    st.stop()
+
 st.title("Results Viewer")
 
-# ========== ALL ACTUAL NEWS FOR SELECTED COMPANY ==========
-docs = fetch_actual_docs(selected, limit=max_items)
-if not docs:
-    st.info("No news for this company.")
-else:
-    for i, doc in enumerate(docs, start=1):
-        st.markdown(f"#### News {i}")
-        render_actual_card(doc)
-        st.divider()
+# Keep the URL in step with the view so it can be shared as-is.
+st.query_params.update({"company": selected.id, "news": str(max_items),
+                        **({"section": link_section} if link_section != "all" else {})})
+
+# news + preview + actuals, usually already in memory; otherwise each section is waited
+# for only where it renders, so news shows while a slow previews source is still answering.
+load = prefetch.open_bundle(selected)
+# one view per company opened: sliders, checkboxes and buttons rerun the script too
+if st.session_state.get("last_viewed") != selected.id:
+    st.session_state.last_viewed = selected.id
+    prefetch.record_view(selected.id)
+if directory_complete:
+    prefetch.prefetch_likely_next(directory, selected.id, watchlist)
+
+def degraded(what: str, reason: str):
+    st.warning(f"{what} is temporarily unavailable ({reason}). Showing everything else.")
+
+if link_section != "results":
+    # ========== SENTIMENT TREND + WEEKLY RANKING (rollups) ==========
+    with st.expander("📈 Sentiment & impact trend (last 90 days)"):
+        try:
+            buckets = get_sentiment_trend(selected.id)
+        except SourceUnavailable as e:
+            st.warning(f"Sentiment trend is temporarily unavailable ({e}).")
+            buckets = None
+        if buckets == []:
+            st.caption("No rollups for this company yet.")
+        elif buckets:
+            df_trend = pd.DataFrame([{
+                "Day": b["bucket"],
+                "Positive": (b.get("sentiment") or {}).get("positive", 0),
+                "Negative": (b.get("sentiment") or {}).get("negative", 0),
+                "Neutral":  (b.get("sentiment") or {}).get("neutral", 0),
+                "Mean impact": rollups.mean_impact(b),
+                "Max impact":  b.get("impact_max"),
+            } for b in buckets]).set_index("Day")
+            st.bar_chart(df_trend[["Positive", "Negative", "Neutral"]])
+            st.line_chart(df_trend[["Mean impact", "Max impact"]])
+
+    with st.expander("🔻 Most negative news this week"):
+        try:
+            ranking = get_most_negative_this_week()
+        except SourceUnavailable as e:
+            st.warning(f"Weekly ranking is temporarily unavailable ({e}).")
+            ranking = None
+        if ranking == []:
+            st.caption("No negative announcements this week.")
+        elif ranking:
+            st.dataframe(pd.DataFrame([{
+                "Company": directory[b["key"]].name or b["key"] if b["key"] in directory else b["key"],
+                "Negative": (b.get("sentiment") or {}).get("negative", 0),
+                "Announcements": b.get("n", 0),
+                "Max negative impact": b.get("neg_impact_max"),
+                "Mean impact": round(rollups.mean_impact(b), 1) if rollups.mean_impact(b) is not None else None,
+            } for b in ranking]), hide_index=True, use_container_width=True)
+
+    # ========== ALL ACTUAL NEWS FOR SELECTED COMPANY ==========
+    with st.spinner("Loading news…"):
+        news, news_error = load.section("news")
+    docs = news[:max_items]
+    if news_error:
+        degraded("News", news_error)
+    elif not docs:
+        st.info("No news for this company.")
+    else:
+        for i, doc in enumerate(docs, start=1):
+            st.markdown(f"#### News {i}")
+            render_actual_card(doc)
+            st.divider()
+
+if link_section == "news":
+    st.stop()
 
 # ========== PREDICTED RESULTS + ACTUALS (VERTICAL TABLE) ==========
-preview_query = fetch_preview_doc_query(selected)
-preview = fetch_preview_doc(preview_query) if preview_query else None
+with st.spinner("Loading predicted results…"):
+    preview, preview_error = load.section("previews")
 
-if preview:
+if preview_error:
+    degraded("Predicted results", preview_error)
+elif preview:
     st.markdown("### Results vs Predictions")
 
-    # Consensus KPIs (predicted)
-    cons = preview.get("consensus") or {}
-    pred_sales  = (cons.get("expected_sales") or {}).get("mean")
-    pred_ebitda = (cons.get("expected_ebitda") or {}).get("mean")
-    pred_pat    = (cons.get("expected_pat") or {}).get("mean")
-    pred_emarg  = (cons.get("ebitda_margin_percent") or {}).get("mean")
-    pred_pmarg  = (cons.get("pat_margin_percent") or {}).get("mean")
-
     # Actuals
-    actual = fetch_actual_results(preview_query, col_fin_handle=col_fin) or {}
-
-    def _surprise_pct(pred, act):
-        try:
-            p = float(pred) if pred is not None else None
-            a = float(act)  if act  is not None else None
-            if p is None or a is None or p == 0.0: return None
-            return (a - p) / p * 100.0
-        except: return None
-
-    rows = [
-        ("Sales (₹ cr)",      pred_sales,  actual.get("sales")),
-        ("EBITDA (₹ cr)",     pred_ebitda, actual.get("ebitda")),
-        ("PAT (₹ cr)",        pred_pat,    actual.get("pat")),
-        ("EBITDA Margin (%)", pred_emarg,  actual.get("ebitda_margin_percent")),
-        ("PAT Margin (%)",    pred_pmarg,  actual.get("pat_margin_percent")),
-    ]
+    actual, actual_error = load.section("actuals")
+    if actual_error:
+        degraded("Actual results", actual_error)
 
     table = []
-    for metric, pred, act in rows:
-        is_pct = "Margin" in metric
-        pred_disp = fmt_pct(pred) if is_pct else fmt_money_cr(pred)
-        act_disp  = fmt_pct(act)  if is_pct else fmt_money_cr(act)
-        surprise  = None if is_pct else _surprise_pct(pred, act)
+    for r in results_rows(preview, actual):
+        fmt = fmt_pct if r["is_pct"] else fmt_money_cr
+        surprise = r["surprise_pct"]
         table.append({
-            "Metric": metric,
-            "Predicted": pred_disp,
-            "Actual": act_disp,
+            "Metric": r["metric"],
+            "Predicted": fmt(r["predicted"]),
+            "Actual": fmt(r["actual"]),
             "Surprise %": (f"{surprise:.1f} %" if surprise is not None else "-")
         })
 
@@ -598,6 +441,23 @@ if preview:
     _rper  = actual.get("period_label") or (preview.get("report_period") or "—")
     st.caption(f"Basis: {_basis} · Period: {_rper}")
 
+    # -------- Consensus drift (one indexed read of the revision history) --------
+    try:
+        drift = get_consensus_drift(str(preview.get("company_id") or selected.id), preview.get("report_period") or "")
+    except SourceUnavailable as e:
+        st.warning(f"Consensus history is temporarily unavailable ({e}).")
+        drift = {}
+    points = drift.get("points") or []
+    if len(points) > 1:
+        st.markdown("#### Consensus drift (last 60 days)")
+        df_drift = pd.DataFrame([{
+            "Snapshot": p["t"], "Sales": p.get("s"), "EBITDA": p.get("e"), "PAT": p.get("p"),
+        } for p in points]).set_index("Snapshot")
+        st.line_chart(df_drift)
+        moves = [f"{label} {chg:+.1f} %" for label, key in (("Sales", "s"), ("EBITDA", "e"), ("PAT", "p"))
+                 if (chg := consensus_history.change_pct(points, key)) is not None]
+        st.caption(f"{len(points)} snapshots · " + (" · ".join(moves) if moves else "no change in the means"))
+
     # -------- Broker table (unchanged) --------
     df = build_broker_df(preview)
     if not df.empty:
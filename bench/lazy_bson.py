@@ -0,0 +1,97 @@
+# bench/lazy_bson.py
+"""
+Decode time and allocations for the page's read path.
+
+    python bench/lazy_bson.py --cards 50 --brokers 400 --repeat 200
+
+"feed"    : a 50-card news page reading the fields render_actual_card shows, with the
+            Raw JSON view closed. Compares full docs decoded eagerly, full docs as
+            RawBSONDocument, and docs projected to NEWS_CARD_FIELDS (what the page fetches).
+"brokers" : broker_rows() over a preview with a large broker_estimates array,
+            eager dicts vs RawBSONDocument (LAZY_BSON=1).
+No Mongo needed: docs are synthetic and encoded to BSON once up front; the projected
+feed is encoded from the card fields only, as the server would send it.
+"""
+import argparse, os, sys, time, tracemalloc
+from datetime import datetime
+
+import bson
+from bson.raw_bson import RawBSONDocument
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data import NEWS_CARD_FIELDS, broker_rows  # noqa: E402
+
+def news_doc(i: int) -> dict:
+    return {
+        "_id": bson.ObjectId(), "symbolmap": {"NSE": "BENCH", "BSE": 500001, "Company_Name": "Bench Ltd"},
+        "company": "INE000000001", "dt_tm": f"2025-07-{1 + i % 28:02d} 10:00:00",
+        "category": "Financial Results", "subcategory": "Quarterly", "sentiment": "Positive",
+        "sensitivity": "High", "timelineflag": "Current", "impactscore": 7,
+        "impact": "Impact text " * 30, "impactscore_deduction": "Deduction " * 20,
+        "shortsummary": "Short summary " * 15, "summary": "Detailed summary " * 120,
+        "pdf_link": "https://example.invalid/a.pdf", "pdf_link_live": "https://example.invalid/b.pdf",
+        # fields the card never reads: extraction payloads, embeddings, audit trail
+        "extracted": {"pages": [{"n": p, "text": "page text " * 200} for p in range(8)]},
+        "embedding": [0.001 * k for k in range(768)],
+        "audit": [{"at": datetime(2025, 7, 1), "by": "pipeline", "step": s} for s in range(20)],
+    }
+
+def preview_doc(brokers: int) -> dict:
+    return {
+        "_id": bson.ObjectId(), "company_id": "BENCH", "updated_at": "2025-07-01T00:00:00Z",
+        "consensus": {k: {"mean": 100.0, "median": 99.0, "stdev": 4.0} for k in
+                      ("expected_sales", "expected_ebitda", "expected_pat", "ebitda_margin_percent", "pat_margin_percent")},
+        "broker_estimates": [{
+            "broker_name": f"Broker {b}", "published_date": "2025-06-20T00:00:00", "report_id": f"r{b}",
+            "expected_sales": 100.0 + b, "expected_ebitda": 20.0, "expected_pat": 10.0,
+            "ebitda_margin_percent": 20.0, "pat_margin_percent": 10.0, "commentary": "Commentary " * 25,
+            "source_url": f"https://example.invalid/{b}.pdf",
+            "raw_tables": [{"row": r, "cells": ["x" * 20] * 12} for r in range(15)],
+        } for b in range(brokers)],
+    }
+
+def read_card(doc):
+    sym = doc.get("symbolmap") or {}
+    (sym.get("Company_Name"), sym.get("NSE"), sym.get("BSE"))
+    return [doc.get(k) for k in NEWS_CARD_FIELDS]
+
+def run(label: str, fn, repeat: int):
+    fn()  # warm
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    per_ms = (time.perf_counter() - t0) / repeat * 1000
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {per_ms:9.3f} ms/op   peak alloc {peak / 1024:9.1f} KB")
+    return per_ms, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cards", type=int, default=50)
+    ap.add_argument("--brokers", type=int, default=400)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    docs = [news_doc(i) for i in range(args.cards)]
+    feed = [bson.encode(d) for d in docs]
+    card = [bson.encode({k: d[k] for k in NEWS_CARD_FIELDS if k in d}) for d in docs]
+    prev = bson.encode(preview_doc(args.brokers))
+    print(f"feed: {args.cards} docs, {sum(map(len, feed)) / 1024:.0f} KB BSON full, "
+          f"{sum(map(len, card)) / 1024:.0f} KB projected   "
+          f"preview: {args.brokers} broker estimates, {len(prev) / 1024:.0f} KB BSON\n")
+
+    e = run("feed    full, eager dict", lambda: [read_card(bson.decode(b)) for b in feed], args.repeat)
+    l = run("feed    full, RawBSON", lambda: [read_card(RawBSONDocument(b)) for b in feed], args.repeat)
+    p = run("feed    projected, dict", lambda: [read_card(bson.decode(b)) for b in card], args.repeat)
+    print(f"{'':<28} RawBSON {e[0] / l[0]:.1f}x, projected {e[0] / p[0]:.1f}x faster than full eager; "
+          f"BSON over the wire {sum(map(len, feed)) / sum(map(len, card)):.1f}x smaller\n")
+
+    e = run("brokers eager dict", lambda: broker_rows(bson.decode(prev)), args.repeat)
+    l = run("brokers lazy RawBSON", lambda: broker_rows(RawBSONDocument(prev)), args.repeat)
+    print(f"{'':<28} {e[0] / l[0]:.1f}x faster, {e[1] / max(1, l[1]):.1f}x less peak allocation")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# bench/load_test.py
+"""
+Concurrent-session load test for app.py, driven through Streamlit's AppTest.
+
+    pip install mongomock                      # only for the in-memory backend
+    python bench/load_test.py --sessions 20 --iterations 5
+    python bench/load_test.py --mongo-uri mongodb://localhost:27017 --db LOADTEST --seed
+
+Each session logs in, then repeatedly selects a company, moves the news slider
+and reruns the page (the broker CSV for the download button is built on every
+rerun). Every session runs in its own process: AppTest installs a fresh
+process-global Runtime (and cache storage) for each run and clears it when the
+run ends, so concurrent AppTests in one process break each other. Sessions start
+together once all processes have imported the app and connected.
+
+Reports throughput, rerun latency percentiles, Mongo commands by name and
+per-session process memory. With --mongo-uri the data goes to --db (collections
+are dropped and re-seeded only with --seed) and all sessions share it; without
+it each session process seeds its own in-memory mongomock.
+"""
+import argparse, multiprocessing, os, queue, random, resource, statistics, sys, threading, time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# -------------------- MONGO OP COUNTING --------------------
+ops: Counter = Counter()
+_ops_lock = threading.Lock()
+
+def _count(name: str):
+    with _ops_lock:
+        ops[name] += 1
+
+def install_pymongo_listener():
+    from pymongo import monitoring
+
+    class _Listener(monitoring.CommandListener):
+        def started(self, event): _count(event.command_name)
+        def succeeded(self, event): pass
+        def failed(self, event): pass
+
+    monitoring.register(_Listener())
+
+def install_mongomock():
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("The in-memory backend needs mongomock (pip install mongomock), or pass --mongo-uri.")
+    import pymongo
+    coll = mongomock.collection.Collection
+    for name in ("find", "find_one", "aggregate", "insert_many", "update_one", "count_documents"):
+        orig = getattr(coll, name)
+        def wrapped(self, *a, _orig=orig, _name=name, **k):
+            _count(_name)
+            return _orig(self, *a, **k)
+        setattr(coll, name, wrapped)
+    pymongo.MongoClient = mongomock.MongoClient  # data.py builds its client from pymongo.MongoClient
+    os.environ.setdefault("LAZY_BSON", "0")      # mongomock does not return RawBSONDocument previews
+
+# -------------------- SEED --------------------
+SENTIMENTS = ("Positive", "Negative", "Neutral")
+CATEGORIES = ("Financial Results", "Board Meeting", "Order Win", "Credit Rating", "Acquisition")
+
+def seed(data, companies: int, news_per_company: int, brokers: int):
+    rnd = random.Random(7)
+    for c in (data.col_news, data.col_prev, data.col_fin):
+        c.drop()
+    news, previews, actuals = [], [], []
+    for i in range(companies):
+        sym = {"NSE": f"LT{i:04d}", "BSE": 700000 + i, "Company_Name": f"Loadtest Company {i:04d} Ltd"}
+        isin = f"INELT{i:07d}"
+        for j in range(news_per_company):
+            news.append({
+                "symbolmap": sym, "company": isin,
+                "dt_tm": f"2025-{1 + j % 12:02d}-{1 + (i + j) % 28:02d} {j % 24:02d}:00:00",
+                "category": rnd.choice(CATEGORIES), "sentiment": rnd.choice(SENTIMENTS),
+                "sensitivity": rnd.choice(("High", "Medium", "Low")), "impactscore": rnd.randint(0, 10),
+                "timelineflag": "Current", "impact": "Impact text " * 20,
+                "shortsummary": "Short summary " * 10, "summary": "Detailed summary " * 80,
+                "pdf_link": f"https://example.invalid/{i}/{j}.pdf",
+            })
+        sales = rnd.uniform(100, 10000)
+        previews.append({
+            "company_id": sym["NSE"], "symbolmap": sym, "company": isin,
+            "updated_at": "2025-07-01T00:00:00Z", "report_period": "Jun2025",
+            "consensus": {"expected_sales": {"mean": sales}, "expected_ebitda": {"mean": sales * .2},
+                          "expected_pat": {"mean": sales * .1}, "ebitda_margin_percent": {"mean": 20.0},
+                          "pat_margin_percent": {"mean": 10.0}},
+            "broker_estimates": [{
+                "broker_name": f"Broker {b}", "published_date": "2025-06-20T00:00:00",
+                "expected_sales": sales * rnd.uniform(.9, 1.1), "expected_ebitda": sales * .2,
+                "expected_pat": sales * .1, "ebitda_margin_percent": 20.0, "pat_margin_percent": 10.0,
+                "commentary": "Commentary " * 15, "source_url": f"https://example.invalid/b{b}.pdf",
+            } for b in range(brokers)],
+        })
+        actuals.append({
+            "company_id": sym["NSE"], "symbolmap": sym, "company": isin, "updated_at": "2025-07-20T00:00:00",
+            "Consolidated": {"actual": {"Jun2025": {"net_sales": sales * 1.02, "ebitda": sales * .21,
+                                                   "net_profit": sales * .09, "unit": "cr"}}},
+        })
+    data.col_news.insert_many(news)
+    data.col_prev.insert_many(previews)
+    data.col_fin.insert_many(actuals)
+
+# -------------------- SESSIONS --------------------
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return float("nan")
+
+def peak_rss_mb() -> float:
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / 1024 / 1024 if sys.platform == "darwin" else r / 1024
+
+def run_session(n: int, ids: list, iterations: int, timeout: float, latencies: list, errors: list):
+    from streamlit.testing.v1 import AppTest
+    rnd = random.Random(n)
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+
+    def timed(step):
+        t0 = time.perf_counter()
+        step()
+        latencies.append(time.perf_counter() - t0)
+        if at.exception:
+            errors.append(f"session {n}: {at.exception[0].value}")
+
+    timed(at.run)                                                   # login page
+    at.text_input(key="login_user").input(os.getenv("APP_USER", "admin"))
+    at.text_input(key="login_pass").input(os.getenv("APP_PASS", "admin123"))
+    timed(lambda: at.button[0].click().run())                       # sign in -> first company
+    for _ in range(iterations):
+        timed(lambda: at.selectbox(key="company_select").set_value(rnd.choice(ids)).run())
+        timed(lambda: at.slider[0].set_value(rnd.randint(1, 50)).run())
+
+def session_process(n: int, args: argparse.Namespace, start, results):
+    """One session in its own process; puts its measurements on `results`."""
+    out = {"n": n, "latencies": [], "errors": [], "ids": 0}
+    try:
+        if args.mongo_uri:
+            install_pymongo_listener()
+        else:
+            install_mongomock()
+        import data
+        from streamlit.testing.v1 import AppTest  # noqa: F401  (import cost stays out of the timings)
+        if not args.mongo_uri:
+            seed(data, args.companies, args.news, args.brokers)
+        ids = list(data.load_company_directory().ids)
+        out["ids"] = len(ids)
+        ops.clear()
+        start.wait(args.setup_timeout)
+        if ids:
+            run_session(n, ids, args.iterations, args.timeout, out["latencies"], out["errors"])
+    except threading.BrokenBarrierError:
+        out["errors"].append(f"session {n}: another session failed to start")
+    except Exception as e:
+        out["errors"].append(f"session {n}: {type(e).__name__}: {e}")
+        start.abort()
+    out.update(ops=dict(ops), rss=rss_mb(), peak=peak_rss_mb())
+    results.put(out)
+
+def pct(values, p):
+    if not values: return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=10)
+    ap.add_argument("--iterations", type=int, default=5, help="select + slider cycles per session")
+    ap.add_argument("--companies", type=int, default=200)
+    ap.add_argument("--news", type=int, default=30, help="news docs per company")
+    ap.add_argument("--brokers", type=int, default=12, help="broker estimates per preview")
+    ap.add_argument("--timeout", type=float, default=60.0, help="AppTest per-rerun timeout, seconds")
+    ap.add_argument("--mongo-uri")
+    ap.add_argument("--db", default="LOADTEST")
+    ap.add_argument("--seed", action="store_true", help="drop and re-seed collections (always on in memory)")
+    ap.add_argument("--setup-timeout", type=float, default=300.0,
+                    help="seconds to wait for every session process to be ready")
+    args = ap.parse_args()
+
+    if args.mongo_uri:
+        os.environ.update(MONGO_URI=args.mongo_uri, DB_NAME=args.db, PREV_DB=args.db, ACTUAL_DB=args.db)
+        if args.seed:
+            import data
+            seed(data, args.companies, args.news, args.brokers)
+
+    # spawn: each session starts from a clean interpreter (no Streamlit runtime or Mongo client to inherit)
+    ctx = multiprocessing.get_context("spawn")
+    start, results = ctx.Barrier(args.sessions + 1), ctx.Queue()
+    procs = [ctx.Process(target=session_process, args=(n, args, start, results), daemon=True)
+             for n in range(args.sessions)]
+    for p in procs:
+        p.start()
+    try:
+        start.wait(args.setup_timeout)
+    except threading.BrokenBarrierError:
+        pass                                   # a session failed during setup; it reports why below
+    t0 = time.perf_counter()
+    outs, errors = [], []
+    deadline = time.monotonic() + args.timeout * (2 + 2 * args.iterations) + args.setup_timeout
+    while len(outs) < len(procs):
+        try:
+            outs.append(results.get(timeout=1.0))
+        except queue.Empty:
+            if time.monotonic() > deadline or not any(p.is_alive() for p in procs):
+                errors.append(f"{len(procs) - len(outs)} session process(es) exited without reporting")
+                break
+    wall = time.perf_counter() - t0
+    for p in procs:
+        p.join(timeout=5)
+
+    latencies = [x for o in outs for x in o["latencies"]]
+    errors = [e for o in outs for e in o["errors"]] + errors
+    for o in outs:
+        ops.update(o["ops"])
+    companies = max((o["ids"] for o in outs), default=0)
+    if outs and not companies:
+        sys.exit("No companies in the news collection; pass --seed.")
+    rss = [o["rss"] for o in outs]
+    peak = [o["peak"] for o in outs]
+
+    ms = [x * 1000 for x in latencies]
+    print(f"sessions={args.sessions} iterations={args.iterations} companies={companies} "
+          f"backend={'mongo' if args.mongo_uri else 'mongomock'}")
+    print(f"reruns      : {len(ms)} in {wall:.2f}s  -> {len(ms) / wall:.1f} reruns/s")
+    if ms:
+        print(f"latency ms  : mean {statistics.mean(ms):.1f}  p50 {pct(ms, 50):.1f}  p90 {pct(ms, 90):.1f}  "
+              f"p99 {pct(ms, 99):.1f}  max {max(ms):.1f}")
+    print(f"mongo ops   : {sum(ops.values())} total  " + "  ".join(f"{k}={v}" for k, v in ops.most_common()))
+    if rss:
+        print(f"memory      : per session process rss mean {statistics.mean(rss):.1f} MB  "
+              f"max {max(rss):.1f} MB  peak {max(peak):.1f} MB")
+    if errors:
+        print(f"errors      : {len(errors)}")
+        for e in errors[:10]:
+            print("  ", e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench/memory_per_session.py
+"""
+Memory per session: old st.cache_data options list vs. the shared CompanyDirectory.
+
+    python bench/memory_per_session.py --companies 5000 --sessions 100
+
+st.cache_data unpickles a fresh copy of its return value for every caller, so
+"before" gives each simulated session its own copy of the option dicts (plus its
+own actuals dict). "after" builds one CompanyDirectory and one read-only actuals
+mapping and each session holds only the selected ID and references.
+No Mongo needed: the directory is built from synthetic aggregation rows.
+"""
+import argparse, gc, os, pickle, sys, tracemalloc
+from types import MappingProxyType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data import Company, CompanyDirectory  # noqa: E402
+
+def synthetic_options(n: int):
+    out = []
+    for i in range(n):
+        nse, bse, name, isin, count = f"SYM{i:05d}", 500000 + i, f"Company Number {i} Limited", f"INE{i:09d}", 1 + i % 40
+        label = f"{name or nse or isin or bse} — NSE {nse or '-'} | BSE {bse or '-'} | ISIN {isin or '-'}  ({count})"
+        out.append({"label": label, "nse": nse, "bse": bse, "name": name, "isin": isin, "count": count})
+    return out
+
+ACTUALS = {"basis": "Consolidated", "period_label": "Jun2025", "sales": 1234.5, "ebitda": 234.5,
+           "pat": 120.0, "ebitda_margin_percent": 19.0, "pat_margin_percent": 9.7}
+
+def measure(fn):
+    gc.collect()
+    tracemalloc.start()
+    keep = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keep
+    return current, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--companies", type=int, default=5000)
+    ap.add_argument("--sessions", type=int, default=100)
+    args = ap.parse_args()
+
+    raw = synthetic_options(args.companies)
+    blob = pickle.dumps(raw)  # what st.cache_data keeps in its store
+
+    def before():
+        sessions = []
+        for s in range(args.sessions):
+            options = pickle.loads(blob)
+            sessions.append({"options": options, "selected": options[s % len(options)], "actual": dict(ACTUALS)})
+        return sessions
+
+    def after():
+        directory = CompanyDirectory([Company(o["nse"], o["bse"], o["name"], o["isin"], o["count"]) for o in raw])
+        actual = MappingProxyType(dict(ACTUALS))
+        sessions = [{"company_select": directory.ids[s % len(directory)], "actual": actual}
+                    for s in range(args.sessions)]
+        return directory, sessions
+
+    b_cur, b_peak = measure(before)
+    a_cur, a_peak = measure(after)
+    mb = 1024 * 1024
+    print(f"companies={args.companies} sessions={args.sessions}")
+    print(f"before: total {b_cur / mb:8.2f} MB  peak {b_peak / mb:8.2f} MB  per-session {b_cur / args.sessions / 1024:9.1f} KB")
+    print(f"after : total {a_cur / mb:8.2f} MB  peak {a_peak / mb:8.2f} MB  per-session {a_cur / args.sessions / 1024:9.1f} KB")
+    print(f"ratio : {b_cur / max(1, a_cur):.1f}x less resident memory")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# consensus_history.py
+"""
+Consensus revision history: how Sales / EBITDA / PAT estimates moved into the results date.
+
+    python consensus_history.py                # incremental: previews updated since the checkpoint
+    python consensus_history.py --rebuild      # drop and rebuild every series
+    python consensus_history.py --follow 300   # keep running, one incremental pass every 300s
+
+One doc per (company, report_period) in CONSENSUS_HISTORY_COLLECTION holding a
+time-sorted `points` array with short keys:
+
+    {t, s, e, p, em, pm, n}   = snapshot time, consensus mean Sales / EBITDA / PAT (₹ cr),
+                                EBITDA / PAT margin %, number of broker estimates
+
+A point is only stored when it differs from the one before it, so a preview that
+is re-saved unchanged costs nothing. Readers fetch a whole series with one indexed
+find_one (consensus_drift).
+"""
+import argparse, os, sys, time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from data import (
+    PREV_COLL, QUERY_MAX_TIME_MS, breakers, db_prev, job_db_prev,
+    checkpoint_filter, _parse_iso, _to_float_or_none,
+)
+
+HISTORY_COLL = os.getenv("CONSENSUS_HISTORY_COLLECTION", "consensus_history")
+col_history = db_prev[HISTORY_COLL]               # page reads (consensus_drift)
+# the job reads and writes through data.job_db_prev: primary, no socket timeout
+job_prev = job_db_prev[PREV_COLL]
+job_history = job_db_prev[HISTORY_COLL]
+col_history_state = job_db_prev[HISTORY_COLL + "_state"]
+CHECKPOINT_ID = "company_result_previews"
+
+# point key -> consensus field
+POINT_FIELDS = {
+    "s": "expected_sales",
+    "e": "expected_ebitda",
+    "p": "expected_pat",
+    "em": "ebitda_margin_percent",
+    "pm": "pat_margin_percent",
+}
+
+# -------------------- SNAPSHOTS --------------------
+def _lookup_keys(doc: Dict[str, Any]) -> List[str]:
+    sym = doc.get("symbolmap") or {}
+    vals = [doc.get("company_id"), sym.get("NSE"), doc.get("company"), sym.get("BSE"), sym.get("Company_Name")]
+    out = []
+    for v in vals:
+        if v is not None and str(v).strip() and str(v).strip().upper() not in out:
+            out.append(str(v).strip().upper())
+    return out
+
+def snapshot(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Consensus point for one preview doc, or None if it has no usable consensus."""
+    cons = doc.get("consensus") or {}
+    point = {k: _to_float_or_none((cons.get(f) or {}).get("mean")) for k, f in POINT_FIELDS.items()}
+    if all(v is None for v in point.values()):
+        return None
+    t = _parse_iso(doc.get("updated_at")) or _parse_iso(doc.get("created_at"))
+    if t is None and hasattr(doc.get("_id"), "generation_time"):
+        t = doc["_id"].generation_time
+    if t is None:
+        return None
+    if t.tzinfo is not None:
+        t = t.astimezone(timezone.utc).replace(tzinfo=None)  # stored naive UTC, like Mongo returns it
+    point["t"] = t
+    point["n"] = len(doc.get("broker_estimates") or [])
+    return point
+
+def _same(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return all(a.get(k) == b.get(k) for k in (*POINT_FIELDS, "n"))
+
+def _series_id(doc: Dict[str, Any]) -> Optional[str]:
+    keys = _lookup_keys(doc)
+    if not keys:
+        return None
+    return f"{keys[0]}|{doc.get('report_period') or '-'}"
+
+def series_updates(docs: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """
+    New points for a batch of previews. Existing series are read once ($in) so a
+    point equal to its predecessor in time order is dropped (delta storage).
+    """
+    incoming: Dict[str, List[tuple]] = {}
+    for d in docs:
+        sid, pt = _series_id(d), snapshot(d)
+        if sid and pt:
+            incoming.setdefault(sid, []).append((pt, d))
+    if not incoming:
+        return []
+
+    existing = {h["_id"]: h.get("points") or []
+                for h in job_history.find({"_id": {"$in": list(incoming)}}, {"points": 1})}
+    ops = []
+    for sid, items in incoming.items():
+        points = list(existing.get(sid, []))
+        new = []
+        for pt, _ in sorted(items, key=lambda x: x[0]["t"]):
+            if any(p["t"] == pt["t"] for p in points):
+                continue
+            prev = max((p for p in points if p["t"] < pt["t"]), key=lambda p: p["t"], default=None)
+            if prev is not None and _same(prev, pt):
+                continue
+            points.append(pt)
+            new.append(pt)
+        if not new:
+            continue
+        src = items[-1][1]
+        ops.append(UpdateOne(
+            {"_id": sid},
+            {
+                "$setOnInsert": {"company_id": (src.get("company_id") or sid.split("|")[0]),
+                                 "report_period": src.get("report_period")},
+                "$addToSet": {"keys": {"$each": _lookup_keys(src)}},
+                "$push": {"points": {"$each": new, "$sort": {"t": 1}}},
+                "$max": {"last_t": max(p["t"] for p in new)},
+            },
+            upsert=True,
+        ))
+    return ops
+
+# -------------------- JOB --------------------
+def ensure_indexes():
+    job_history.create_index([("keys", ASCENDING), ("report_period", ASCENDING)])
+    job_history.create_index([("keys", ASCENDING), ("last_t", DESCENDING)])
+    job_prev.create_index([("updated_at", ASCENDING), ("_id", ASCENDING)])
+
+def run_pass(rebuild: bool = False, batch: int = 500, log=print) -> int:
+    if rebuild:
+        job_history.delete_many({})
+        col_history_state.delete_one({"_id": CHECKPOINT_ID})
+        log("rebuilding consensus history")
+    cp = col_history_state.find_one({"_id": CHECKPOINT_ID})
+    done = 0
+    while True:
+        docs = list(job_prev.find(checkpoint_filter(cp), {"broker_estimates.broker_name": 1, **{
+            k: 1 for k in ("company_id", "symbolmap", "company", "report_period", "consensus", "updated_at", "created_at")
+        }}).sort([("updated_at", ASCENDING), ("_id", ASCENDING)]).limit(batch))
+        if not docs:
+            break
+        ops = series_updates(docs)
+        if ops:
+            job_history.bulk_write(ops, ordered=True)
+        last = docs[-1]
+        done += len(docs)
+        cp = {"_id": CHECKPOINT_ID, "updated_at": last.get("updated_at"), "last_id": last["_id"],
+              "saved_at": datetime.now(timezone.utc)}
+        col_history_state.replace_one({"_id": CHECKPOINT_ID}, cp, upsert=True)
+        log(f"  {done} previews, {len(ops)} series updated in last batch")
+    return done
+
+# -------------------- READS --------------------
+def consensus_drift(company_query: str, report_period: Optional[str] = None, days: int = 60) -> Optional[Dict[str, Any]]:
+    """
+    Consensus points for one company/period over the last `days` (plus the last
+    point before the window as the baseline), from a single indexed read.
+    Without report_period the most recently revised series is used.
+    """
+    q = (company_query or "").strip().upper()
+    if not q:
+        return None
+    filt: Dict[str, Any] = {"keys": q}
+    if report_period:
+        filt["report_period"] = report_period
+    doc = breakers["previews"].call(lambda: col_history.find_one(
+        filt, {"_id": 0, "company_id": 1, "report_period": 1, "points": 1},
+        sort=[("last_t", DESCENDING)], max_time_ms=QUERY_MAX_TIME_MS))
+    if not doc:
+        return None
+    points = doc.get("points") or []
+    since = datetime.utcnow() - timedelta(days=days)
+    before = [p for p in points if p["t"] < since]
+    window = ([before[-1]] if before else []) + [p for p in points if p["t"] >= since]
+    return {"company_id": doc.get("company_id"), "report_period": doc.get("report_period"), "points": window}
+
+def change_pct(points: List[Dict[str, Any]], key: str) -> Optional[float]:
+    """First-to-last move of one consensus field across `points`, in %."""
+    vals = [p.get(key) for p in points if p.get(key) is not None]
+    if len(vals) < 2 or not vals[0]:
+        return None
+    return (vals[-1] - vals[0]) / abs(vals[0]) * 100.0
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rebuild", action="store_true", help="drop all series and rebuild from every preview")
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--follow", type=float, metavar="SECONDS", help="repeat incremental passes at this interval")
+    args = ap.parse_args()
+
+    ensure_indexes()
+    n = run_pass(rebuild=args.rebuild, batch=args.batch)
+    print(f"processed {n} previews into {HISTORY_COLL}")
+    while args.follow:
+        time.sleep(args.follow)
+        n = run_pass(batch=args.batch, log=lambda *_: None)
+        if n:
+            print(f"processed {n} new/updated previews")
+
+if __name__ == "__main__":
+    sys.exit(main())
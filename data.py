@@ -0,0 +1,925 @@
+# data.py
+"""
+Data layer shared by the Streamlit page (app.py) and the JSON API (api.py).
+No Streamlit imports here: everything is plain pymongo / pandas.
+"""
+import os, re, sys, threading, time
+from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, List, Tuple
+
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+import pymongo
+from pymongo import MongoClient
+from pymongo.errors import (
+    AutoReconnect, ExecutionTimeout, NetworkTimeout, PyMongoError, ServerSelectionTimeoutError,
+)
+import pandas as pd
+from dotenv import load_dotenv
+
+# -------------------- LOAD ENV (.env if present) --------------------
+load_dotenv()
+
+# -------------------- CONFIG --------------------
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME   = os.getenv("DB_NAME", "RAG_CHATBOT")
+NEWS_COLL = os.getenv("NEWS_COLLECTION", "selected_ann")                # <- actual/announcement docs
+PREV_DB   = os.getenv("PREV_DB", "CAG_CHATBOT")                         # <- previews live here if separate DB
+PREV_COLL = os.getenv("PREV_COLLECTION", "company_result_previews")     # <- predicted results
+
+# Actuals source -> LatestCmotData
+ACTUAL_DB   = os.getenv("ACTUAL_DB", DB_NAME)                           # set ACTUAL_DB in .env if different
+ACTUAL_COLL = os.getenv("ACTUAL_COLLECTION", "LatestCmotData")
+# Canonical per-period actuals written by normalize_actuals.py (same DB as ACTUAL_DB)
+ACTUAL_NORM_COLL = os.getenv("ACTUAL_NORM_COLLECTION", "actuals_normalized")
+# normalized: read only the canonical collection; legacy: only LatestCmotData extraction;
+# auto: canonical first, legacy for companies not migrated yet
+ACTUALS_SOURCE   = os.getenv("ACTUALS_SOURCE", "auto").strip().lower()
+ACTUALS_SCHEMA_VERSION = 1
+
+# Per-source connections: each backing store gets its own client, timeouts and breaker.
+# URIs default to MONGO_URI; timeouts bound connect / server selection / socket reads.
+NEWS_MONGO_URI   = os.getenv("NEWS_MONGO_URI", MONGO_URI)
+PREV_MONGO_URI   = os.getenv("PREV_MONGO_URI", MONGO_URI)
+ACTUAL_MONGO_URI = os.getenv("ACTUAL_MONGO_URI", MONGO_URI)
+NEWS_TIMEOUT_MS   = int(os.getenv("NEWS_TIMEOUT_MS", "3000"))
+PREV_TIMEOUT_MS   = int(os.getenv("PREV_TIMEOUT_MS", "3000"))
+ACTUAL_TIMEOUT_MS = int(os.getenv("ACTUAL_TIMEOUT_MS", "3000"))
+QUERY_MAX_TIME_MS = int(os.getenv("QUERY_MAX_TIME_MS", "2000"))            # server-side maxTimeMS on every query
+DIRECTORY_TIMEOUT_MS = int(os.getenv("DIRECTORY_TIMEOUT_MS", "30000"))    # whole-collection directory $group
+READ_PREFERENCE   = os.getenv("READ_PREFERENCE", "secondaryPreferred")    # route reads off the primary
+BREAKER_FAILURES  = int(os.getenv("BREAKER_FAILURES", "3"))               # consecutive failures before opening
+BREAKER_RESET_S   = float(os.getenv("BREAKER_RESET_S", "30"))             # open -> retry after this long
+
+# Preview docs come back as RawBSONDocument: bytes until a field is read, nested
+# sub-docs (broker_estimates entries) stay raw until touched. LAZY_BSON=0 for plain dicts.
+LAZY_BSON = os.getenv("LAZY_BSON", "1").strip().lower() not in ("0", "false", "no")
+
+# Process-wide reference data (directory, normalized actuals) refresh interval, seconds
+REFDATA_TTL = float(os.getenv("REFDATA_TTL", "600"))
+
+# -------------------- DB --------------------
+def _make_client(uri: str, timeout_ms: int) -> MongoClient:
+    return MongoClient(
+        uri,
+        serverSelectionTimeoutMS=timeout_ms,
+        connectTimeoutMS=timeout_ms,
+        socketTimeoutMS=timeout_ms,
+        readPreference=READ_PREFERENCE,
+    )
+
+news_client   = _make_client(NEWS_MONGO_URI, NEWS_TIMEOUT_MS)
+prev_client   = _make_client(PREV_MONGO_URI, PREV_TIMEOUT_MS)
+actual_client = _make_client(ACTUAL_MONGO_URI, ACTUAL_TIMEOUT_MS)
+client = news_client
+
+# Batch jobs and index builds (normalize_actuals, rollups, consensus_history, ensure_news_indexes)
+# get their own clients: primary reads and no socket timeout, since an index build or a wide
+# aggregation legitimately runs longer than a page read. connect=False: nothing is opened
+# until a job uses them, so the page and the API pay nothing for these.
+def _make_job_client(uri: str, timeout_ms: int) -> MongoClient:
+    return MongoClient(
+        uri,
+        serverSelectionTimeoutMS=timeout_ms,
+        connectTimeoutMS=timeout_ms,
+        readPreference="primary",
+        connect=False,
+    )
+
+job_db_news   = _make_job_client(NEWS_MONGO_URI, NEWS_TIMEOUT_MS)[DB_NAME]
+job_db_prev   = _make_job_client(PREV_MONGO_URI, PREV_TIMEOUT_MS)[PREV_DB or DB_NAME]
+job_db_actual = _make_job_client(ACTUAL_MONGO_URI, ACTUAL_TIMEOUT_MS)[ACTUAL_DB]
+
+db_news  = news_client[DB_NAME]
+col_news = db_news[NEWS_COLL]
+db_prev  = prev_client[PREV_DB or DB_NAME]
+col_prev = db_prev[PREV_COLL]
+db_actual = actual_client[ACTUAL_DB]
+col_fin   = db_actual[ACTUAL_COLL]
+col_fin_norm = db_actual[ACTUAL_NORM_COLL]
+
+_RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+def _lazy(col):
+    return col.with_options(codec_options=_RAW_OPTIONS) if LAZY_BSON else col
+
+col_prev_lazy = _lazy(col_prev)
+
+# -------------------- CIRCUIT BREAKERS --------------------
+class SourceUnavailable(Exception):
+    """A backing database timed out, failed, or its breaker is open."""
+
+    def __init__(self, source: str, reason: str = ""):
+        super().__init__(f"{source} unavailable" + (f" ({reason})" if reason else ""))
+        self.source = source
+        self.reason = reason
+
+# Errors that say the source is slow or unreachable. Anything else (a bad pipeline, an
+# unsupported operator on an older server) fails the same way every time and is not
+# the database's health, so it is reported but never opens the breaker.
+TRANSIENT_ERRORS = (NetworkTimeout, ServerSelectionTimeoutError, AutoReconnect, ExecutionTimeout)
+
+class CircuitBreaker:
+    """
+    Fail fast after `max_failures` consecutive timeout / connection errors. Once `reset_after`
+    seconds have passed since the breaker opened it is half-open: a single trial call goes
+    through (everyone else still fails fast) and closes the breaker, or reopens it on failure.
+    """
+
+    def __init__(self, name: str, max_failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET_S):
+        self.name = name
+        self.max_failures = max_failures
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False                     # a half-open trial call is in flight
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being refused (open, or half-open with the trial in flight)."""
+        with self._lock:
+            return self._opened_at is not None and (
+                self._trial or time.monotonic() - self._opened_at < self.reset_after)
+
+    def _admit(self) -> bool:
+        """Whether this call is the half-open trial; raises if the breaker refuses it."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if self._trial or time.monotonic() - self._opened_at < self.reset_after:
+                raise SourceUnavailable(self.name, "circuit open")
+            self._trial = True
+            return True
+
+    def _settle(self, trial: bool, healthy: Optional[bool]):
+        """Record a call's outcome: healthy, unhealthy, or None when it says nothing about the source."""
+        with self._lock:
+            if trial:
+                self._trial = False
+            if healthy:
+                self._failures = 0
+                self._opened_at = None
+            elif healthy is not None:
+                self._failures += 1
+                if trial or self._failures >= self.max_failures:
+                    self._opened_at = time.monotonic()
+
+    def call(self, fn: Callable[[], Any]):
+        trial = self._admit()
+        try:
+            result = fn()
+        except TRANSIENT_ERRORS as e:
+            self._settle(trial, healthy=False)
+            raise SourceUnavailable(self.name, type(e).__name__) from e
+        except PyMongoError as e:
+            # the server answered (and rejected the query): a trial call has still reached it
+            self._settle(trial, healthy=True if trial else None)
+            raise SourceUnavailable(self.name, type(e).__name__) from e
+        except BaseException:
+            self._settle(trial, healthy=None)
+            raise
+        self._settle(trial, healthy=True)
+        return result
+
+breakers = {
+    "news": CircuitBreaker("news"),
+    "previews": CircuitBreaker("previews"),
+    "actuals": CircuitBreaker("actuals"),
+}
+
+# -------------------- SHARED CACHE --------------------
+class TTLCache:
+    """Small thread-safe, process-wide cache: key -> value, expiring after `ttl` seconds."""
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 4096):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Any, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[Any, threading.Lock] = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None: return default
+            expires, value = hit
+            if expires < time.monotonic():
+                self._data.pop(key, None)
+                return default
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            if len(self._data) >= self.maxsize:
+                # drop the entry closest to expiry
+                oldest = min(self._data, key=lambda k: self._data[k][0])
+                self._data.pop(oldest, None)
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def get_or_set(self, key, factory: Callable[[], Any], ttl: Optional[float] = None):
+        """Single-flight: concurrent misses on one key run `factory` once and share the value."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = factory()
+                self.set(key, value, ttl)
+            with self._lock:
+                self._loading.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+_MISSING = object()
+
+class RefreshingValue:
+    """
+    One process-wide value that is rebuilt in the background once older than `ttl`.
+    Readers keep the previous value until the new one is built (stale-while-revalidate);
+    only the very first read waits, and concurrent builds are collapsed into one.
+    """
+
+    def __init__(self, factory: Callable[[], Any], ttl: float, name: str = "refresh"):
+        self._factory = factory
+        self.ttl = ttl
+        self.name = name
+        self._value: Any = _MISSING
+        self._built_at = 0.0
+        self._build_lock = threading.Lock()     # one build at a time
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def peek(self) -> Optional[Any]:
+        """The current value, however old, or None before the first build; never builds."""
+        value = self._value
+        return None if value is _MISSING else value
+
+    def get(self) -> Any:
+        if self._value is _MISSING:
+            with self._build_lock:
+                if self._value is _MISSING:
+                    self._build()
+        elif time.monotonic() - self._built_at > self.ttl:
+            self.refresh_in_background()
+        return self._value
+
+    def _build(self):
+        value = self._factory()
+        self._value, self._built_at = value, time.monotonic()
+
+    def refresh_in_background(self):
+        """Build (or rebuild) on a daemon thread unless a refresh is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        requested = time.monotonic()
+        def run():
+            try:
+                with self._build_lock:
+                    if self._built_at < requested:  # not already rebuilt while we waited
+                        self._build()
+            except Exception:
+                pass  # keep serving the previous value; the next stale read retries
+            finally:
+                with self._lock:
+                    self._refreshing = False
+        threading.Thread(target=run, name=self.name, daemon=True).start()
+
+# -------------------- JOB CHECKPOINTS --------------------
+def checkpoint_filter(cp: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Docs after checkpoint {updated_at, last_id} in (updated_at, _id) order, for
+    resumable batch jobs. Docs without updated_at sort first and are covered too.
+    """
+    if not cp:
+        return {}
+    if cp["updated_at"] is None:
+        return {"$or": [
+            {"updated_at": {"$ne": None}},
+            {"updated_at": None, "_id": {"$gt": cp["last_id"]}},
+        ]}
+    return {"$or": [
+        {"updated_at": {"$gt": cp["updated_at"]}},
+        {"updated_at": cp["updated_at"], "_id": {"$gt": cp["last_id"]}},
+    ]}
+
+# -------------------- HELPERS --------------------
+def _try_int(x):
+    try: return int(str(x).strip())
+    except: return None
+
+def _to_float_or_none(x):
+    try: return float(x)
+    except Exception: return None
+
+def _parse_iso(v) -> Optional[datetime]:
+    if not v: return None
+    try: return datetime.fromisoformat(str(v).replace("Z","+00:00"))
+    except: return None
+
+# Month mapping for period parsing
+_MONTHS = {"Jan":1,"Feb":2,"Mar":3,"Apr":4,"May":5,"Jun":6,"Jul":7,"Aug":8,"Sep":9,"Oct":10,"Nov":11,"Dec":12}
+
+@lru_cache(maxsize=4096)
+def _period_to_dt(label: Optional[str]) -> datetime:
+    """
+    Parse 'Jun2025' or 'Jun-2025' -> datetime(2025,6,1)
+    """
+    if not label:
+        return datetime.min
+    m = re.match(r"([A-Za-z]{3})-?(\d{4})", str(label).strip())
+    if not m:
+        return datetime.min
+    mon = _MONTHS.get(m.group(1)[:3].title(), 1)
+    yr  = int(m.group(2))
+    return datetime(yr, mon, 1)
+
+@lru_cache(maxsize=4096)
+def _parse_results_period_label(label: Optional[str]) -> datetime:
+    """Parse 'Quarter ended 30-Jun-2025' -> datetime(2025,6,30)."""
+    if not label:
+        return datetime.min
+    m = re.search(r'(\d{1,2})-([A-Za-z]{3})-(\d{4})', str(label))
+    if not m:
+        return datetime.min
+    day = int(m.group(1)); mon = _MONTHS.get(m.group(2)[:3].title(), 1); yr = int(m.group(3))
+    return datetime(yr, mon, day)
+
+def _to_crores(val, unit: Optional[str]) -> Optional[float]:
+    """
+    Normalize numeric to ₹ crores.
+    For LatestCmotData you already store 'unit': 'cr' -> factor 1.0 (safe no-op).
+    """
+    v = _to_float_or_none(val)
+    if v is None: return None
+    u = (unit or "").strip().lower()
+    if u in ("cr","crore","crores","₹ cr","inr cr"): factor = 1.0
+    elif u in ("mn","million","millions"): factor = 0.1
+    elif u in ("bn","billion","billions"): factor = 100.0
+    else: factor = 1.0
+    return v * factor
+
+# -------- Preview (predictions) --------
+def fetch_preview_doc(company_query: str) -> Optional[Dict[str, Any]]:
+    q = (company_query or "").strip()
+    if not q: return None
+    or_filters = [
+        {"company_id": q.upper()},
+        {"symbolmap.NSE": q.upper()},
+        {"company_display": {"$regex": q, "$options":"i"}},
+        {"company_key": {"$regex": q, "$options":"i"}},
+        {"symbolmap.Company_Name": {"$regex": q, "$options":"i"}},
+        {"company": q.upper()},  # ISIN exact
+    ]
+    if q.isdigit():
+        try: or_filters.append({"symbolmap.BSE": int(q)})
+        except: pass
+
+    docs = breakers["previews"].call(
+        lambda: list(col_prev_lazy.find({"$or": or_filters}).max_time_ms(QUERY_MAX_TIME_MS)))
+    if not docs: return None
+
+    def keyer(d):
+        for k in ("updated_at","created_at"):
+            v = _parse_iso(d.get(k))
+            if v: return v
+        return datetime.min
+
+    docs.sort(key=keyer, reverse=True)
+    return docs[0]
+
+def broker_rows(preview: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def r1(x):
+        v = _to_float_or_none(x)
+        return round(v, 1) if v is not None else None
+
+    rows = []
+    for b in (preview.get("broker_estimates") or []):
+        pdf_name   = b.get("source_file") or b.get("report_id") or ""
+        source_url = b.get("source_url") or ""
+        rows.append({
+            "Broker": b.get("broker_name"),
+            "Published": (b.get("published_date","") or "")[:10],
+            "Expected Sales (₹ cr)":  r1(b.get("expected_sales")),
+            "Expected EBITDA (₹ cr)": r1(b.get("expected_ebitda")),
+            "Expected PAT (₹ cr)":    r1(b.get("expected_pat")),
+            "EBITDA Margin %":        r1(b.get("ebitda_margin_percent")),
+            "PAT Margin %":           r1(b.get("pat_margin_percent")),
+            "Commentary": b.get("commentary",""),
+            "PDF": source_url or pdf_name,
+        })
+    return rows
+
+def build_broker_df(preview: Dict[str, Any]) -> pd.DataFrame:
+    df = pd.DataFrame(broker_rows(preview))
+    for c in ["Expected Sales (₹ cr)","Expected EBITDA (₹ cr)","Expected PAT (₹ cr)",
+              "EBITDA Margin %","PAT Margin %"]:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").round(1)
+    return df
+
+# -------- Actuals (LatestCmotData) extractors --------
+def _extract_from_latest_cmot(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    LatestCmotData structure:
+      - doc["Consolidated"] or doc["Standalone"] is a dict of { "Jun2025": {...}, "actual": {"Jun2025": {... unit: 'cr'}} }
+    Prefer Consolidated; else Standalone.
+    Use 'actual' if present, else latest quarter key.
+    """
+    for basis in ("Consolidated", "Standalone"):
+        block = doc.get(basis)
+        if not isinstance(block, dict):
+            continue
+
+        # 1) Prefer 'actual' sub-block
+        actual_block = block.get("actual")
+        if not isinstance(actual_block, dict):
+            actual_block = {}
+        # pick latest period from keys like "Jun2025"; periods that are not dicts are skipped
+        period_keys = [k for k in actual_block if k and isinstance(k, str) and isinstance(actual_block[k], dict)]
+        if period_keys:
+            period_keys.sort(key=lambda x: _period_to_dt(x), reverse=True)
+            sel_key = period_keys[0]
+            m = actual_block[sel_key]
+            unit = m.get("unit")  # already 'cr'
+            sales  = _to_crores(m.get("net_sales"),  unit)
+            ebitda = _to_crores(m.get("ebitda"),     unit)
+            pat    = _to_crores(m.get("net_profit"), unit)
+            emarg  = _to_float_or_none(m.get("ebitda_margin"))
+            pmarg  = _to_float_or_none(m.get("pat_margin"))
+            return {
+                "basis": basis,
+                "period_label": sel_key,
+                "sales": sales,
+                "ebitda": ebitda,
+                "pat": pat,
+                "ebitda_margin_percent": emarg,
+                "pat_margin_percent": pmarg,
+            }
+
+        # 2) Fallback to latest quarter entry in the block (exclude the 'actual' key)
+        quarter_keys = [k for k in block.keys() if k != "actual" and isinstance(block.get(k), dict)]
+        if quarter_keys:
+            quarter_keys.sort(key=lambda x: _period_to_dt(x), reverse=True)
+            sel_key = quarter_keys[0]
+            m = block.get(sel_key) or {}
+            # assume values in crores already
+            sales  = _to_float_or_none(m.get("net_sales"))
+            ebitda = _to_float_or_none(m.get("ebitda") or m.get("operating_profit"))
+            pat    = _to_float_or_none(m.get("net_profit"))
+            emarg  = _to_float_or_none(m.get("ebitda_margin"))
+            pmarg  = _to_float_or_none(m.get("pat_margin"))
+            return {
+                "basis": basis,
+                "period_label": sel_key,
+                "sales": sales,
+                "ebitda": ebitda,
+                "pat": pat,
+                "ebitda_margin_percent": emarg,
+                "pat_margin_percent": pmarg,
+            }
+    return None
+
+# Backward-compat extractor (older 'results' schema) — kept for safety
+def _extract_from_results(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    res = (doc.get("results") or {})
+    cons = res.get("Consolidated") or []
+    stand = res.get("Standalone") or []
+    basis = arr = None
+    if cons: basis, arr = "Consolidated", cons
+    elif stand: basis, arr = "Standalone", stand
+    else: return None
+
+    def _key(it):
+        lbl = ((it.get("period") or {}).get("label")) or ""
+        return _parse_results_period_label(lbl)
+    arr_sorted = sorted(arr, key=_key, reverse=True)
+    item = arr_sorted[0]
+    metrics = (item.get("metrics") or {}); unit = metrics.get("unit")
+
+    sales_cr  = _to_crores(metrics.get("Sales"), unit)
+    ebitda_cr = _to_crores(metrics.get("EBITDA") or metrics.get("Ebitda") or metrics.get("EBITDA_Profit"), unit)
+    pat_cr    = _to_crores(metrics.get("PAT") or metrics.get("Net_Profit") or metrics.get("Profit_After_Tax"), unit)
+    emargin   = _to_float_or_none(metrics.get("EBITDA_Margin") or metrics.get("Ebitda_Margin") or metrics.get("EBITDA_Margin_%"))
+    pmargin   = _to_float_or_none(metrics.get("PAT_Margin") or metrics.get("PAT_Margin_%"))
+
+    if emargin is None and ebitda_cr and sales_cr:
+        emargin = (ebitda_cr / sales_cr) * 100.0
+    if pmargin is None and pat_cr and sales_cr:
+        pmargin = (pat_cr / sales_cr) * 100.0
+
+    period_label = ((item.get("period") or {}).get("label")) or (doc.get("period") or None)
+    return {
+        "basis": basis,
+        "period_label": period_label,
+        "sales": sales_cr,
+        "ebitda": ebitda_cr,
+        "pat": pat_cr,
+        "ebitda_margin_percent": emargin,
+        "pat_margin_percent": pmargin,
+    }
+
+def _extract_flat(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Final fallback: flat keys anywhere in the doc (rare)."""
+    def _deep_get(d: Any, key: str) -> Optional[Any]:
+        if not isinstance(d, dict): return None
+        if key in d: return d[key]
+        for v in d.values():
+            if isinstance(v, dict):
+                got = _deep_get(v, key)
+                if got is not None: return got
+        return None
+
+    def _pick_any(doc_: Dict[str, Any], candidates) -> Optional[Any]:
+        for k in candidates:
+            v = _deep_get(doc_, k)
+            if v is not None: return v
+        return None
+
+    sales   = _pick_any(doc, ["actual_sales","sales","net_sales","revenue","total_income"])
+    ebitda  = _pick_any(doc, ["actual_ebitda","ebitda","operating_profit"])
+    pat     = _pick_any(doc, ["actual_pat","pat","net_profit","profit_after_tax","net_profit"])
+    e_marg  = _pick_any(doc, ["ebitda_margin_percent","ebitda_margin"])
+    p_marg  = _pick_any(doc, ["pat_margin_percent","pat_margin"])
+    return {
+        "basis": doc.get("basis"),
+        "period_label": doc.get("period"),
+        "sales": _to_float_or_none(sales),
+        "ebitda": _to_float_or_none(ebitda),
+        "pat": _to_float_or_none(pat),
+        "ebitda_margin_percent": _to_float_or_none(e_marg),
+        "pat_margin_percent": _to_float_or_none(p_marg),
+    }
+
+def extract_actuals(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """LatestCmotData shape first, then the older 'results' array, then flat keys."""
+    return _extract_from_latest_cmot(doc) or _extract_from_results(doc) or _extract_flat(doc)
+
+def fetch_preview_doc_query(selected: Dict[str, Any]) -> Optional[str]:
+    return (
+        selected.get("nse")
+        or selected.get("isin")
+        or selected.get("name")
+        or (str(selected.get("bse")) if selected.get("bse") is not None else None)
+    )
+
+def fetch_actual_doc(company_query: str, col_fin_handle) -> Optional[Dict[str, Any]]:
+    """Newest LatestCmotData doc (by updated_at) matching the query."""
+    q = (company_query or "").strip()
+    if not q:
+        return None
+
+    or_filters = [
+        {"company_id": q.upper()},
+        {"symbolmap.NSE": q.upper()},
+        {"company": q.upper()},  # ISIN
+        {"company_display": {"$regex": q, "$options":"i"}},
+        {"company_key": {"$regex": q, "$options":"i"}},
+        {"symbolmap.Company_Name": {"$regex": q, "$options":"i"}},
+    ]
+    if q.isdigit():
+        try: or_filters.append({"symbolmap.BSE": int(q)})
+        except: pass
+
+    docs = breakers["actuals"].call(
+        lambda: list(col_fin_handle.find({"$or": or_filters}).max_time_ms(QUERY_MAX_TIME_MS)))
+    if not docs:
+        return None
+
+    def sort_key(d):
+        # Prefer updated_at if present
+        v = _parse_iso(d.get("updated_at"))
+        if v: return (2, v)
+        return (0, datetime.min)
+
+    docs.sort(key=sort_key, reverse=True)
+    return docs[0]
+
+def fetch_actual_results(company_query: str,
+                         col_fin_handle,
+                         basis: Optional[str] = None,
+                         report_period: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Fetch actuals from LatestCmotData (preferred) with fallback to older 'results' schema.
+    """
+    doc = fetch_actual_doc(company_query, col_fin_handle)
+    return extract_actuals(doc) if doc else None
+
+ACTUAL_FIELDS = ("basis", "period_label", "sales", "ebitda", "pat", "ebitda_margin_percent", "pat_margin_percent")
+
+def fetch_normalized_actual_doc(company_query: str) -> Optional[Dict[str, Any]]:
+    """
+    Current canonical actuals row for a company: one indexed find_one on
+    (keys, selected, schema_version), newest source doc first. No schema sniffing.
+    """
+    q = (company_query or "").strip().upper()
+    if not q:
+        return None
+    return breakers["actuals"].call(lambda: col_fin_norm.find_one(
+        {"keys": q, "selected": True, "schema_version": ACTUALS_SCHEMA_VERSION},
+        projection={k: 1 for k in ACTUAL_FIELDS},
+        sort=[("source_updated_at", -1)],
+        max_time_ms=QUERY_MAX_TIME_MS,
+    ))
+
+def resolve_actuals(company_query: str) -> Dict[str, Any]:
+    """Actuals per ACTUALS_SOURCE: the canonical row, LatestCmotData extraction, or both in turn."""
+    if ACTUALS_SOURCE != "legacy":
+        doc = fetch_normalized_actual_doc(company_query)
+        if doc:
+            return {k: doc.get(k) for k in ACTUAL_FIELDS}
+        if ACTUALS_SOURCE == "normalized":
+            return {}
+    doc = fetch_actual_doc(company_query, col_fin)
+    return extract_actuals(doc) if doc else {}
+
+_actuals_cache = TTLCache(ttl=REFDATA_TTL)
+
+def get_actuals(company_query: str) -> Mapping[str, Any]:
+    """
+    Normalized actuals, held once per process as a read-only mapping and shared
+    by every session / API thread until REFDATA_TTL expires.
+    """
+    key = (company_query or "").strip().upper()
+    return _actuals_cache.get_or_set(key, lambda: MappingProxyType(resolve_actuals(company_query)))
+
+# -------- Predicted vs actual --------
+def _surprise_pct(pred, act):
+    try:
+        p = float(pred) if pred is not None else None
+        a = float(act)  if act  is not None else None
+        if p is None or a is None or p == 0.0: return None
+        return (a - p) / p * 100.0
+    except: return None
+
+def results_rows(preview: Dict[str, Any], actual: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Consensus mean vs actual per metric, with surprise % for the absolute (non-margin) metrics."""
+    cons = preview.get("consensus") or {}
+    rows = [
+        ("Sales (₹ cr)",      "expected_sales",        "sales"),
+        ("EBITDA (₹ cr)",     "expected_ebitda",       "ebitda"),
+        ("PAT (₹ cr)",        "expected_pat",          "pat"),
+        ("EBITDA Margin (%)", "ebitda_margin_percent", "ebitda_margin_percent"),
+        ("PAT Margin (%)",    "pat_margin_percent",    "pat_margin_percent"),
+    ]
+    out = []
+    for metric, cons_key, act_key in rows:
+        pred = (cons.get(cons_key) or {}).get("mean")
+        act  = actual.get(act_key)
+        is_pct = "Margin" in metric
+        out.append({
+            "metric": metric,
+            "is_pct": is_pct,
+            "predicted": pred,
+            "actual": act,
+            "surprise_pct": None if is_pct else _surprise_pct(pred, act),
+        })
+    return out
+
+# ---------- Dropdown options (only companies that have news) ----------
+def load_company_options() -> List[Dict[str, Any]]:
+    pipeline = [
+        {"$group": {"_id": {
+            "nse": "$symbolmap.NSE",
+            "bse": "$symbolmap.BSE",
+            "name": "$symbolmap.Company_Name",
+            "isin": "$company"
+        }, "count": {"$sum": 1}}},
+        {"$sort": {"_id.name": 1}}
+    ]
+    # A full-collection $group: its own budget instead of the per-card QUERY_MAX_TIME_MS.
+    # pymongo.timeout also lifts the client's socket timeout for this one call.
+    def run():
+        with pymongo.timeout(DIRECTORY_TIMEOUT_MS / 1000):
+            return list(col_news.aggregate(pipeline))
+    items = breakers["news"].call(run)
+    out = []
+    for it in items:
+        _id = it["_id"] or {}
+        nse = _id.get("nse"); bse = _id.get("bse"); name = _id.get("name"); isin = _id.get("isin")
+        label = f"{name or nse or isin or bse} — NSE {nse or '-'} | BSE {bse or '-'} | ISIN {isin or '-'}  ({it['count']})"
+        out.append({"label": label, "nse": nse, "bse": bse, "name": name, "isin": isin, "count": it["count"]})
+    return out
+
+def company_key(opt) -> Optional[str]:
+    """Stable ID for a directory entry: NSE symbol, else ISIN, else BSE code, else name."""
+    for k in ("nse", "isin", "bse", "name"):
+        if opt.get(k) is not None and str(opt.get(k)).strip():
+            return str(opt[k]).strip().upper()
+    return None
+
+def _norm_expr(field: str) -> Dict[str, Any]:
+    return {"$toUpper": {"$trim": {"input": {"$toString": field}}}}
+
+# company_key over a news doc, for aggregations: the first of NSE, ISIN, BSE code, name
+# that is present and not blank, trimmed and upper-cased (null when all are blank).
+COMPANY_KEY_EXPR: Dict[str, Any] = {"$switch": {
+    "branches": [{"case": {"$ne": [_norm_expr(f), ""]}, "then": _norm_expr(f)}
+                 for f in ("$symbolmap.NSE", "$company", "$symbolmap.BSE", "$symbolmap.Company_Name")],
+    "default": None,
+}}
+
+def _intern(v):
+    return sys.intern(v) if isinstance(v, str) else v
+
+class Company:
+    """
+    Read-only directory entry. __slots__ keeps it compact; `get` / `[]` keep it
+    usable wherever the old option dicts were (fetch_actual_docs, fetch_preview_doc_query).
+    """
+    __slots__ = ("id", "nse", "bse", "name", "isin", "count", "label")
+
+    def __init__(self, nse, bse, name, isin, count: int):
+        for k, v in (("nse", nse), ("bse", bse), ("name", name), ("isin", isin), ("count", count)):
+            object.__setattr__(self, k, _intern(v))
+        object.__setattr__(self, "id", _intern(company_key(self)))
+        object.__setattr__(self, "label",
+            f"{name or nse or isin or bse} — NSE {nse or '-'} | BSE {bse or '-'} | ISIN {isin or '-'}  ({count})")
+
+    def __setattr__(self, k, v):
+        raise AttributeError("Company is read-only")
+
+    def __getitem__(self, k):
+        return getattr(self, k)
+
+    def get(self, k, default=None):
+        return getattr(self, k, default)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"Company({self.id!r})"
+
+class CompanyDirectory:
+    """Immutable company directory: ordered IDs plus lookup by NSE / ISIN / BSE / name."""
+    __slots__ = ("ids", "_by_id", "_aliases", "_pos")
+
+    def __init__(self, companies: List[Company]):
+        by_id: Dict[str, Company] = {}
+        aliases: Dict[str, str] = {}
+        for c in companies:
+            if c.id is None:
+                continue
+            first = by_id.get(c.id)
+            # same ID under another (nse, bse, name, isin) group: one entry, summed count
+            by_id[c.id] = c if first is None else \
+                Company(first.nse, first.bse, first.name, first.isin, first.count + c.count)
+            for k in ("nse", "isin", "bse", "name"):
+                v = c.get(k)
+                if v is not None and str(v).strip():
+                    aliases.setdefault(str(v).strip().upper(), c.id)
+        self.ids: Tuple[str, ...] = tuple(by_id)
+        self._by_id = MappingProxyType(by_id)
+        self._aliases = MappingProxyType(aliases)
+        self._pos = MappingProxyType({cid: i for i, cid in enumerate(self.ids)})
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Company]:
+        return (self._by_id[i] for i in self.ids)
+
+    def __getitem__(self, cid: str) -> Company:
+        return self._by_id[cid]
+
+    def __contains__(self, cid) -> bool:
+        return cid in self._by_id
+
+    def index_of(self, cid: str) -> Optional[int]:
+        return self._pos.get(cid)
+
+    def lookup(self, query: str) -> Optional[Company]:
+        cid = self._aliases.get((query or "").strip().upper())
+        return self._by_id[cid] if cid else None
+
+def load_company_directory() -> CompanyDirectory:
+    return CompanyDirectory([
+        Company(o["nse"], o["bse"], o["name"], o["isin"], o["count"]) for o in load_company_options()
+    ])
+
+_directory = RefreshingValue(load_company_directory, ttl=REFDATA_TTL, name="directory")
+
+def get_company_directory() -> CompanyDirectory:
+    """Process-wide directory; refreshed in the background every REFDATA_TTL seconds."""
+    return _directory.get()
+
+def peek_company_directory() -> Optional[CompanyDirectory]:
+    """The process-wide directory if it has been built (possibly being refreshed); never loads it."""
+    return _directory.peek()
+
+def load_company_directory_in_background():
+    """Start building the directory on a daemon thread (one build at a time)."""
+    _directory.refresh_in_background()
+
+# Case-insensitive comparison for company names; the name index in ensure_news_indexes uses it.
+NAME_COLLATION = {"locale": "en", "strength": 2}
+
+def _company_matching(match: Dict[str, Any]) -> Optional[Company]:
+    """The most recently active (nse, bse, name, isin) group among news docs matching `match`."""
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": {"nse": "$symbolmap.NSE", "bse": "$symbolmap.BSE",
+                            "name": "$symbolmap.Company_Name", "isin": "$company"},
+                    "count": {"$sum": 1}, "latest": {"$max": "$dt_tm"}}},
+        {"$sort": {"latest": -1}},
+        {"$limit": 1},
+    ]
+    items = breakers["news"].call(lambda: list(col_news.aggregate(pipeline, maxTimeMS=QUERY_MAX_TIME_MS)))
+    if not items: return None
+    _id = items[0]["_id"] or {}
+    return Company(_id.get("nse"), _id.get("bse"), _id.get("name"), _id.get("isin"), items[0]["count"])
+
+def find_company(query: str) -> Optional[Company]:
+    """
+    One directory entry by NSE symbol, ISIN, BSE code or name, read straight from the
+    news collection, for deep links opened before the directory is built. Same grouping
+    as load_company_options, so the entry's ID matches the directory's. Codes are exact
+    indexed matches; only on a miss is the name looked up, case-insensitively (like
+    CompanyDirectory.lookup) through the collated name index.
+    """
+    q = (query or "").strip()
+    if not q: return None
+    ors = [{"symbolmap.NSE": q.upper()}, {"company": q.upper()}]
+    if q.isdigit():
+        ors.append({"symbolmap.BSE": int(q)})
+    found = _company_matching({"$or": ors})
+    if found is not None:
+        return found
+    # the stored spelling of the name, then the same exact-match grouping on it
+    doc = breakers["news"].call(lambda: col_news.find_one(
+        {"symbolmap.Company_Name": q}, {"symbolmap.Company_Name": 1},
+        collation=NAME_COLLATION, sort=[("dt_tm", -1)], max_time_ms=QUERY_MAX_TIME_MS))
+    name = ((doc or {}).get("symbolmap") or {}).get("Company_Name")
+    return _company_matching({"symbolmap.Company_Name": name}) if name is not None else None
+
+def ensure_news_indexes():
+    """Indexes behind find_company, fetch_actual_docs and the watchlist aggregation."""
+    col = job_db_news[NEWS_COLL]
+    for field in ("symbolmap.NSE", "company", "symbolmap.BSE", "symbolmap.Company_Name"):
+        col.create_index([(field, 1), ("dt_tm", -1)])
+    col.create_index([("symbolmap.Company_Name", 1), ("dt_tm", -1)],
+                     name="symbolmap.Company_Name_ci_dt_tm", collation=NAME_COLLATION)
+
+# ---------- Fetch ALL news docs for selected company ----------
+# Fields render_actual_card reads; the page fetches only these and loads the
+# full doc by _id when its Raw JSON view is requested (fetch_news_doc).
+NEWS_CARD_FIELDS = ("_id", "symbolmap", "dt_tm", "company", "category", "subcategory", "sentiment",
+                    "sensitivity", "timelineflag", "impactscore", "impact", "impactscore_deduction",
+                    "shortsummary", "summary", "pdf_link_live", "pdf_link")
+
+def fetch_actual_docs(opt: Dict[str, Any], limit: int = 50,
+                      fields: Optional[Tuple[str, ...]] = None) -> List[Dict[str, Any]]:
+    ors = []
+    if opt.get("nse"):  ors.append({"symbolmap.NSE": opt["nse"]})
+    if opt.get("bse"):  ors.append({"symbolmap.BSE": opt["bse"]})
+    if opt.get("isin"): ors.append({"company": opt["isin"]})
+    if opt.get("name"): ors.append({"symbolmap.Company_Name": opt["name"]})
+    if not ors: return []
+    return breakers["news"].call(
+        lambda: list(col_news.find({"$or": ors}, projection=list(fields) if fields else None)
+                     .sort("dt_tm", -1).limit(limit).max_time_ms(QUERY_MAX_TIME_MS)))
+
+def fetch_news_doc(doc_id) -> Optional[Dict[str, Any]]:
+    """Full announcement doc, for the Raw JSON view."""
+    return breakers["news"].call(lambda: col_news.find_one({"_id": doc_id}, max_time_ms=QUERY_MAX_TIME_MS))
+
+def fetch_latest_news_by_company(companies: List[Company], k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Latest `k` announcements for each company in one aggregation, for the watchlist page.
+    Each doc is keyed the way company_key keys the directory (COMPANY_KEY_EXPR). Groups
+    come back as {_id: company ID, items, latest, top_impact}, the most recently
+    announced first, and items newest then highest impact first. Needs MongoDB 5.2+ ($topN).
+    """
+    if not companies or k <= 0:
+        return []
+    ids = [c.id for c in companies]
+    ors = [{f: {"$in": vals}} for f, vals in (
+        ("symbolmap.NSE", [c.nse for c in companies if c.nse]),
+        ("company", [c.isin for c in companies if c.isin]),
+        ("symbolmap.BSE", [c.bse for c in companies if c.bse]),
+        ("symbolmap.Company_Name", [c.name for c in companies if c.name]),
+    ) if vals]
+    pipeline = [
+        {"$match": {"$or": ors}},
+        {"$project": {**{f: 1 for f in NEWS_CARD_FIELDS}, "_cid": COMPANY_KEY_EXPR}},
+        {"$match": {"_cid": {"$in": ids}}},
+        {"$group": {
+            "_id": "$_cid",
+            "items": {"$topN": {"n": k, "sortBy": {"dt_tm": -1, "impactscore": -1}, "output": "$$ROOT"}},
+            "latest": {"$max": "$dt_tm"},
+            "top_impact": {"$max": "$impactscore"},
+        }},
+        {"$sort": {"latest": -1, "top_impact": -1}},
+    ]
+    return breakers["news"].call(lambda: list(col_news.aggregate(pipeline, maxTimeMS=QUERY_MAX_TIME_MS)))
@@ -0,0 +1,190 @@
+# normalize_actuals.py
+"""
+Write-time normalization of LatestCmotData into one canonical per-period schema.
+
+    python normalize_actuals.py                 # incremental: docs updated since the checkpoint
+    python normalize_actuals.py --full          # reprocess everything (also automatic on a schema bump)
+    python normalize_actuals.py --follow 60     # keep running, one incremental pass every 60s
+
+Every source doc (LatestCmotData shape, older 'results' array, or flat keys) becomes
+one row per basis/period in ACTUAL_NORM_COLLECTION:
+
+    {_id, schema_version, keys: [...], basis, period_label, period_end, source,
+     sales, ebitda, pat (₹ cr), ebitda_margin_percent, pat_margin_percent,
+     selected, source_id, source_updated_at}
+
+`selected` marks the row the old read-time extraction would have shown, so the
+page reads actuals with a single indexed find_one (data.fetch_normalized_actual_doc).
+Progress is checkpointed per batch by (updated_at, _id) and resumes after a crash.
+"""
+import argparse, sys, time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+
+from data import (
+    ACTUALS_SCHEMA_VERSION, ACTUAL_COLL, ACTUAL_NORM_COLL, ACTUAL_FIELDS, job_db_actual,
+    _extract_from_latest_cmot, _extract_from_results, _extract_flat,
+    _period_to_dt, _parse_results_period_label, checkpoint_filter,
+)
+
+STATE_COLL = ACTUAL_NORM_COLL + "_state"
+# data.job_db_actual: primary, no socket timeout (the page's clients give up after a few seconds)
+col_fin = job_db_actual[ACTUAL_COLL]
+col_fin_norm = job_db_actual[ACTUAL_NORM_COLL]
+CHECKPOINT_ID = "LatestCmotData"
+
+# -------------------- CANONICAL ROWS --------------------
+def _lookup_keys(doc: Dict[str, Any]) -> List[str]:
+    sym = doc.get("symbolmap") or {}
+    vals = [doc.get("company_id"), sym.get("NSE"), doc.get("company"), sym.get("BSE"),
+            sym.get("Company_Name"), doc.get("company_display"), doc.get("company_key")]
+    out = []
+    for v in vals:
+        if v is not None and str(v).strip() and str(v).strip().upper() not in out:
+            out.append(str(v).strip().upper())
+    return out
+
+def _period_end(label: Optional[str]) -> Optional[datetime]:
+    dt = _period_to_dt(label)
+    if dt == datetime.min:
+        dt = _parse_results_period_label(label)
+    return None if dt == datetime.min else dt
+
+def _derive_margins(row: Dict[str, Any]) -> Dict[str, Any]:
+    sales = row.get("sales")
+    if row.get("ebitda_margin_percent") is None and row.get("ebitda") is not None and sales:
+        row["ebitda_margin_percent"] = row["ebitda"] / sales * 100.0
+    if row.get("pat_margin_percent") is None and row.get("pat") is not None and sales:
+        row["pat_margin_percent"] = row["pat"] / sales * 100.0
+    return row
+
+def _extracted_rows(doc: Dict[str, Any]) -> List[tuple]:
+    """
+    (source, values) per basis/period, in the read path's order of preference:
+    for each basis, 'actual' periods newest first, else quarter periods newest first;
+    then the 'results' array; then flat keys. The first row is what extract_actuals returns.
+    """
+    rows = []
+    for basis in ("Consolidated", "Standalone"):
+        block = doc.get(basis)
+        if not isinstance(block, dict):
+            continue
+        actual_block = block.get("actual")
+        if isinstance(actual_block, dict):
+            keys = sorted((k for k in actual_block if k and isinstance(k, str) and isinstance(actual_block[k], dict)),
+                          key=_period_to_dt, reverse=True)
+            rows += [("latest_cmot.actual", _extract_from_latest_cmot({basis: {"actual": {k: actual_block[k]}}}))
+                     for k in keys]
+        quarters = sorted((k for k in block if k != "actual" and isinstance(block.get(k), dict)),
+                          key=_period_to_dt, reverse=True)
+        rows += [("latest_cmot.quarter", _extract_from_latest_cmot({basis: {k: block[k]}})) for k in quarters]
+    if rows:
+        return rows
+
+    res = doc.get("results") or {}
+    for basis in ("Consolidated", "Standalone"):
+        items = sorted(res.get(basis) or [],
+                       key=lambda it: _parse_results_period_label(((it.get("period") or {}).get("label")) or ""),
+                       reverse=True)
+        rows += [("results", _extract_from_results({"results": {basis: [it]}, "period": doc.get("period")}))
+                 for it in items]
+    if rows:
+        return rows
+    return [("flat", _extract_flat(doc))]
+
+def canonical_rows(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Canonical rows for one source doc. The first (`selected`) row carries the same basis,
+    period and values as extract_actuals(doc), except that missing EBITDA / PAT margins
+    are derived from sales (extract_actuals derives them only for the 'results' shape,
+    and only when EBITDA / PAT are non-zero). tests/test_normalize_actuals.py checks this.
+    """
+    keys = _lookup_keys(doc)
+    src_id = doc.get("_id")
+    out = []
+    for source, values in _extracted_rows(doc):
+        if not values:
+            continue
+        row = {k: values.get(k) for k in ACTUAL_FIELDS}
+        _derive_margins(row)
+        row.update({
+            "_id": f"{src_id}|{row.get('basis')}|{source}|{row.get('period_label')}",
+            "schema_version": ACTUALS_SCHEMA_VERSION,
+            "keys": keys,
+            "period_end": _period_end(row.get("period_label")),
+            "source": source,
+            "selected": not out,
+            "source_id": src_id,
+            "source_updated_at": doc.get("updated_at"),
+        })
+        out.append(row)
+    return out
+
+# -------------------- JOB --------------------
+def ensure_indexes():
+    col_fin_norm.create_index([("keys", ASCENDING), ("selected", ASCENDING),
+                               ("schema_version", ASCENDING), ("source_updated_at", DESCENDING)])
+    col_fin_norm.create_index([("source_id", ASCENDING)])
+    col_fin.create_index([("updated_at", ASCENDING), ("_id", ASCENDING)])
+
+def load_checkpoint() -> Optional[Dict[str, Any]]:
+    cp = job_db_actual[STATE_COLL].find_one({"_id": CHECKPOINT_ID})
+    if cp and cp.get("schema_version") != ACTUALS_SCHEMA_VERSION:
+        return None  # schema bump -> full rebuild
+    return cp
+
+def save_checkpoint(updated_at, last_id, processed: int):
+    job_db_actual[STATE_COLL].replace_one(
+        {"_id": CHECKPOINT_ID},
+        {"_id": CHECKPOINT_ID, "schema_version": ACTUALS_SCHEMA_VERSION,
+         "updated_at": updated_at, "last_id": last_id, "processed": processed, "saved_at": datetime.now(timezone.utc)},
+        upsert=True,
+    )
+
+def write_rows(doc: Dict[str, Any]) -> int:
+    rows = canonical_rows(doc)
+    ids = [r["_id"] for r in rows]
+    if rows:
+        col_fin_norm.bulk_write([ReplaceOne({"_id": r["_id"]}, r, upsert=True) for r in rows], ordered=False)
+    # drop rows this source doc no longer produces (e.g. a period was corrected away)
+    col_fin_norm.delete_many({"source_id": doc.get("_id"), "_id": {"$nin": ids}})
+    return len(rows)
+
+def run_pass(full: bool = False, batch: int = 500, log=print) -> int:
+    cp = None if full else load_checkpoint()
+    if cp is None:
+        log(f"full pass (schema v{ACTUALS_SCHEMA_VERSION})")
+    processed = (cp or {}).get("processed", 0)
+    done = 0
+    while True:
+        docs = list(col_fin.find(checkpoint_filter(cp)).sort([("updated_at", ASCENDING), ("_id", ASCENDING)]).limit(batch))
+        if not docs:
+            break
+        rows = sum(write_rows(d) for d in docs)
+        last = docs[-1]
+        processed += len(docs); done += len(docs)
+        cp = {"updated_at": last.get("updated_at"), "last_id": last["_id"]}
+        save_checkpoint(cp["updated_at"], cp["last_id"], processed)
+        log(f"  {done} docs ({rows} rows in last batch), checkpoint updated_at={cp['updated_at']}")
+    return done
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--full", action="store_true", help="ignore the checkpoint and reprocess every doc")
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--follow", type=float, metavar="SECONDS", help="repeat incremental passes at this interval")
+    args = ap.parse_args()
+
+    ensure_indexes()
+    n = run_pass(full=args.full, batch=args.batch)
+    print(f"normalized {n} source docs into {ACTUAL_NORM_COLL}")
+    while args.follow:
+        time.sleep(args.follow)
+        n = run_pass(batch=args.batch, log=lambda *_: None)
+        if n:
+            print(f"normalized {n} new/updated source docs")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+# prefetch.py
+"""
+Process-wide company bundles (news + preview + actuals), a start-up warm-up and
+background prefetch of the companies a user is likely to open next.
+Plain threads, no Streamlit calls, so it is safe to use from app.py and api.py.
+"""
+import os, threading
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from data import (
+    REFDATA_TTL, QUERY_MAX_TIME_MS, TTLCache, Company, CompanyDirectory, SourceUnavailable,
+    NEWS_CARD_FIELDS, breakers, col_news, db_news, fetch_actual_docs, fetch_preview_doc, fetch_preview_doc_query, get_actuals,
+)
+
+# -------------------- CONFIG --------------------
+PREFETCH_TTL      = float(os.getenv("PREFETCH_TTL", "120"))     # bundle freshness, seconds
+DEGRADED_TTL      = float(os.getenv("DEGRADED_TTL", "5"))       # bundles with a failed section retry sooner
+PREFETCH_SIZE     = int(os.getenv("PREFETCH_SIZE", "256"))      # max bundles held
+PREFETCH_WORKERS  = int(os.getenv("PREFETCH_WORKERS", "4"))
+PAGE_WORKERS      = int(os.getenv("PAGE_WORKERS", "48"))        # section loads for pages users are waiting on
+PREFETCH_ADJACENT = int(os.getenv("PREFETCH_ADJACENT", "2"))    # directory neighbours on each side
+WARMUP_COMPANIES  = int(os.getenv("WARMUP_COMPANIES", "25"))    # most-viewed + recently announced
+NEWS_MAX          = 50                                          # matches the page's slider max
+VIEWS_COLL        = os.getenv("VIEWS_COLLECTION", "company_views")  # per-company view counts, in DB_NAME
+
+class Bundle(NamedTuple):
+    news: List[Dict[str, Any]]      # card fields only (data.NEWS_CARD_FIELDS)
+    preview: Optional[Dict[str, Any]]
+    actuals: Mapping[str, Any]
+    errors: Mapping[str, str]       # section ("news" / "previews" / "actuals") -> reason; empty when complete
+
+_bundles  = TTLCache(ttl=PREFETCH_TTL, maxsize=PREFETCH_SIZE)
+_recent   = TTLCache(ttl=REFDATA_TTL, maxsize=1)
+# View counts outlive the process, so a fresh process warms up what users actually open.
+col_views = db_news[VIEWS_COLL]
+_inflight: set = set()
+_inflight_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+# Sections of one bundle load side by side, so a slow source only delays itself.
+# Pages a user is waiting on get their own pool, so they never queue behind prefetch.
+_sections = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS * 3, thread_name_prefix="bundle")
+_page_sections = ThreadPoolExecutor(max_workers=PAGE_WORKERS, thread_name_prefix="page")
+
+# -------------------- BUNDLES --------------------
+_EMPTY = {"news": [], "previews": None, "actuals": {}}
+_FIELDS = {"news": "news", "previews": "preview", "actuals": "actuals"}
+
+def _submit(company: Company, executor: ThreadPoolExecutor) -> Dict[str, Optional[Future]]:
+    q = fetch_preview_doc_query(company)
+    return {
+        "news": executor.submit(fetch_actual_docs, company, NEWS_MAX, NEWS_CARD_FIELDS),
+        "previews": executor.submit(fetch_preview_doc, q) if q else None,
+        "actuals": executor.submit(get_actuals, q) if q else None,
+    }
+
+def _section(section: str, fut: Optional[Future]) -> Tuple[Any, Optional[str]]:
+    """(value, error) for one section; waits for it if it is still loading."""
+    try:
+        value = fut.result() if fut else None
+    except SourceUnavailable as e:
+        return _EMPTY[section], e.reason or "unavailable"
+    return (_EMPTY[section] if value is None else value), None
+
+def _collect(futures: Dict[str, Optional[Future]]) -> Bundle:
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for section, fut in futures.items():
+        results[_FIELDS[section]], err = _section(section, fut)
+        if err:
+            errors[section] = err
+    return Bundle(errors=errors, **results)
+
+def _load_bundle(company: Company) -> Bundle:
+    return _collect(_submit(company, _sections))
+
+def _store(company_id: str, bundle: Bundle):
+    _bundles.set(company_id, bundle, ttl=DEGRADED_TTL if bundle.errors else None)
+
+class PageLoad:
+    """
+    One company's sections for a page: the cached bundle, or sections loading on the
+    page pool. Callers wait on one section at a time, so news renders while a slow
+    previews source is still answering; the bundle is cached once every section is in.
+    """
+
+    def __init__(self, company: Company):
+        self._bundle: Optional[Bundle] = _bundles.get(company.id)
+        self._futures: Dict[str, Optional[Future]] = {}
+        if self._bundle is not None:
+            return
+        self._futures = _submit(company, _page_sections)
+        pending = [f for f in self._futures.values() if f]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                if all(f.done() for f in pending) and _bundles.get(company.id) is None:
+                    _store(company.id, _collect(self._futures))
+        for f in pending:
+            f.add_done_callback(on_done)
+
+    def section(self, section: str) -> Tuple[Any, Optional[str]]:
+        """(value, error) for "news" / "previews" / "actuals"; error is None when it loaded."""
+        if self._bundle is not None:
+            return getattr(self._bundle, _FIELDS[section]), self._bundle.errors.get(section)
+        return _section(section, self._futures[section])
+
+    def bundle(self) -> Bundle:
+        return self._bundle if self._bundle is not None else _collect(self._futures)
+
+def open_bundle(company: Company) -> PageLoad:
+    """Start (or reuse) one company's load without waiting for any section."""
+    return PageLoad(company)
+
+def get_bundle(company: Company) -> Bundle:
+    """Cached bundle for one company; loads on a miss and waits for every section."""
+    return open_bundle(company).bundle()
+
+def is_cached(company_id: str) -> bool:
+    return _bundles.get(company_id) is not None
+
+def _prefetch_one(company: Company):
+    try:
+        if not is_cached(company.id):
+            _store(company.id, _load_bundle(company))
+    except Exception:
+        pass  # best effort: the page falls back to a synchronous load
+    finally:
+        with _inflight_lock:
+            _inflight.discard(company.id)
+
+def prefetch(companies: Iterable[Company]):
+    """Queue background loads for companies not already cached or in flight."""
+    for c in companies:
+        if c is None or is_cached(c.id):
+            continue
+        with _inflight_lock:
+            if c.id in _inflight:
+                continue
+            _inflight.add(c.id)
+        _pool.submit(_prefetch_one, c)
+
+# -------------------- PREDICTION --------------------
+def record_view(company_id: str):
+    """Count one opening of a company's page, off the caller's thread; a lost count is harmless."""
+    def run():
+        try:
+            col_views.update_one({"_id": company_id},
+                                 {"$inc": {"n": 1}, "$set": {"last_viewed": datetime.now(timezone.utc)}}, upsert=True)
+        except Exception:
+            pass
+    _pool.submit(run)
+
+def most_viewed(n: int) -> List[str]:
+    """Most-viewed company IDs across all processes and restarts."""
+    return breakers["news"].call(lambda: [
+        d["_id"] for d in col_views.find({}, {"_id": 1}).sort("n", -1).limit(n).max_time_ms(QUERY_MAX_TIME_MS)])
+
+def recently_announced(directory: CompanyDirectory, n: int) -> List[Company]:
+    """Companies behind the newest announcements, newest first (cached for REFDATA_TTL)."""
+    def load():
+        cursor = breakers["news"].call(lambda: list(
+            col_news.find({}, {"symbolmap.NSE": 1, "company": 1, "symbolmap.BSE": 1, "symbolmap.Company_Name": 1})
+            .sort("dt_tm", -1).limit(max(200, n * 4)).max_time_ms(QUERY_MAX_TIME_MS)))
+        out, seen = [], set()
+        for d in cursor:
+            sym = d.get("symbolmap") or {}
+            for key in (sym.get("NSE"), d.get("company"), sym.get("BSE"), sym.get("Company_Name")):
+                c = directory.lookup(str(key)) if key is not None else None
+                if c:
+                    if c.id not in seen:
+                        seen.add(c.id); out.append(c.id)
+                    break
+        return out
+    ids = _recent.get_or_set("recent", load)
+    return [directory[i] for i in ids[:n] if i in directory]
+
+def likely_next(directory: CompanyDirectory, current_id: str,
+                watchlist: Sequence[str] = (), n_recent: int = 5) -> List[Company]:
+    """Adjacent directory entries, then watchlist, then recently announced companies."""
+    out: List[Company] = []
+    pos = directory.index_of(current_id)
+    if pos is not None:
+        for step in range(1, PREFETCH_ADJACENT + 1):
+            for i in (pos + step, pos - step):
+                if 0 <= i < len(directory):
+                    out.append(directory[directory.ids[i]])
+    out += [c for c in (directory.lookup(w) for w in watchlist) if c]
+    out += recently_announced(directory, n_recent)
+    return [c for c in out if c.id != current_id]
+
+def prefetch_likely_next(directory: CompanyDirectory, current_id: str, watchlist: Sequence[str] = ()):
+    """Work out likely-next companies and prefetch them, all off the caller's thread."""
+    def run():
+        try: prefetch(likely_next(directory, current_id, watchlist))
+        except Exception: pass
+    _pool.submit(run)
+
+# -------------------- WARM-UP --------------------
+def warm_up(get_directory: Callable[[], CompanyDirectory], n: int = WARMUP_COMPANIES) -> threading.Thread:
+    """
+    Start a background load of the most-viewed (persisted in VIEWS_COLLECTION) and most
+    recently announced companies; the directory itself is built on the same thread.
+    """
+    def run():
+        try:
+            directory = get_directory()
+            picks = [directory.lookup(cid) for cid in most_viewed(n)]
+            picks += recently_announced(directory, n)
+            seen, todo = set(), []
+            for c in picks:
+                if c and c.id not in seen:
+                    seen.add(c.id); todo.append(c)
+            prefetch(todo[:n])
+        except Exception:
+            pass  # warm-up is an optimisation; never block start-up on it
+    t = threading.Thread(target=run, name="warm-up", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,221 @@
+# rollups.py
+"""
+Precomputed sentiment / impact-score rollups over the news collection.
+
+    python rollups.py                 # incremental: announcements added since the checkpoint
+    python rollups.py --rebuild       # drop and recompute every bucket
+    python rollups.py --follow 60     # keep running, one incremental pass every 60s
+
+One doc per (grain, scope, key, bucket) in ROLLUP_COLLECTION:
+
+    grain : "day" | "week" (weeks start on Monday)
+    scope : "company" (key = directory ID, see data.company_key) | "category" (key = category)
+    n, sentiment.{positive,negative,neutral,other}, impact_sum, impact_n, impact_max,
+    neg_impact_sum, neg_impact_max
+
+Passes walk announcements by insertion time (the ObjectId timestamp), starting
+ROLLUP_OVERLAP_S before the checkpoint so docs from writers with skewed clocks are
+not skipped. Every bucket a batch touches is recomputed from the source docs and
+replaced, so re-reading the overlap or resuming after a crash never double-counts.
+Edits to existing announcements are picked up by --rebuild. Readers (trend,
+most_negative) are single indexed queries.
+"""
+import argparse, os, sys, time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+
+from data import (
+    COMPANY_KEY_EXPR, NEWS_COLL, QUERY_MAX_TIME_MS, breakers, db_news, job_db_news,
+    company_key, _to_float_or_none,
+)
+
+ROLLUP_COLL = os.getenv("ROLLUP_COLLECTION", "news_rollups")
+col_rollup = db_news[ROLLUP_COLL]                 # page reads (trend, most_negative)
+# the job reads and writes through data.job_db_news: primary, no socket timeout
+job_news = job_db_news[NEWS_COLL]
+job_rollup = job_db_news[ROLLUP_COLL]
+col_rollup_state = job_db_news[ROLLUP_COLL + "_state"]
+CHECKPOINT_ID = "selected_ann"
+OVERLAP_S = float(os.getenv("ROLLUP_OVERLAP_S", "600"))   # re-read window before the checkpoint
+SENTIMENTS = ("positive", "negative", "neutral", "other")
+
+# -------------------- BUCKETING --------------------
+def sentiment_class(s: Any) -> str:
+    """Same buckets as the card pill colours: contains neg / pos / neu."""
+    s = str(s or "").lower()
+    if "neg" in s: return "negative"
+    if "pos" in s: return "positive"
+    if "neu" in s: return "neutral"
+    return "other"
+
+def _day(dt_tm: Any) -> Optional[datetime]:
+    if isinstance(dt_tm, datetime):
+        return datetime(dt_tm.year, dt_tm.month, dt_tm.day)
+    try: return datetime.strptime(str(dt_tm)[:10], "%Y-%m-%d")
+    except: return None
+
+PROJECTION = {"dt_tm": 1, "sentiment": 1, "impactscore": 1, "category": 1, "symbolmap": 1, "company": 1}
+
+def week_start(day: datetime) -> datetime:
+    return day - timedelta(days=day.weekday())
+
+def _doc_company(doc: Dict[str, Any]) -> Optional[str]:
+    sym = doc.get("symbolmap") or {}
+    return company_key({"nse": sym.get("NSE"), "isin": doc.get("company"),
+                        "bse": sym.get("BSE"), "name": sym.get("Company_Name")})
+
+def _bucket_id(b: tuple) -> str:
+    grain, scope, key, bucket = b
+    return f"{grain}|{scope}|{key}|{bucket:%Y-%m-%d}"
+
+def fold(docs: Iterable[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+    """Complete bucket docs, keyed by (grain, scope, key, bucket), for the announcements given."""
+    out: Dict[tuple, Dict[str, Any]] = {}
+    for d in docs:
+        day = _day(d.get("dt_tm"))
+        if day is None:
+            continue
+        sent = sentiment_class(d.get("sentiment"))
+        impact = _to_float_or_none(d.get("impactscore"))
+        scopes = [("company", _doc_company(d)), ("category", str(d.get("category") or "Uncategorized"))]
+        for grain, bucket in (("day", day), ("week", week_start(day))):
+            for scope, key in scopes:
+                if not key:
+                    continue
+                b = (grain, scope, key, bucket)
+                a = out.get(b)
+                if a is None:
+                    a = out[b] = {"_id": _bucket_id(b), "grain": grain, "scope": scope, "key": key, "bucket": bucket,
+                                  "n": 0, "sentiment": dict.fromkeys(SENTIMENTS, 0),
+                                  "impact_sum": 0.0, "impact_n": 0, "neg_impact_sum": 0.0}
+                a["n"] += 1
+                a["sentiment"][sent] += 1
+                if impact is not None:
+                    a["impact_sum"] += impact
+                    a["impact_n"] += 1
+                    a["impact_max"] = max(a.get("impact_max", impact), impact)
+                    if sent == "negative":
+                        a["neg_impact_sum"] += impact
+                        a["neg_impact_max"] = max(a.get("neg_impact_max", impact), impact)
+    return out
+
+def _source_docs(touched: Iterable[tuple]) -> Iterable[Dict[str, Any]]:
+    """
+    Every announcement in a touched week for a touched company or category (a superset of
+    the touched buckets), streamed. Each week is its own dt_tm range, so one back-dated
+    announcement adds one week to the read instead of widening it to years.
+    """
+    touched = list(touched)
+    weeks = sorted({week_start(b[3]) for b in touched})
+    companies = sorted({b[2] for b in touched if b[1] == "company"})
+    categories = sorted({b[2] for b in touched if b[1] == "category"})
+    if "Uncategorized" in categories:
+        categories += [None, ""]
+    ranges = []
+    for w in weeks:
+        end = w + timedelta(days=7)
+        ranges += [{"dt_tm": {"$gte": f"{w:%Y-%m-%d}", "$lt": f"{end:%Y-%m-%d}"}},
+                   {"dt_tm": {"$gte": w, "$lt": end}}]
+    pipeline = [
+        {"$match": {"$or": ranges}},
+        {"$project": {**{f: 1 for f in PROJECTION}, "_cid": COMPANY_KEY_EXPR}},
+        {"$match": {"$or": [{"_cid": {"$in": companies}}, {"category": {"$in": categories}}]}},
+    ]
+    return job_news.aggregate(pipeline)
+
+def bucket_replacements(batch: List[Dict[str, Any]]) -> List[ReplaceOne]:
+    """
+    Buckets the batch touches, each recomputed in full from the source collection, as
+    upserting replacements: applying them twice leaves the same result as once.
+    """
+    touched = fold(batch).keys()
+    if not touched:
+        return []
+    full = fold(_source_docs(touched))
+    return [ReplaceOne({"_id": full[b]["_id"]}, full[b], upsert=True) for b in touched if b in full]
+
+# -------------------- JOB --------------------
+def ensure_indexes():
+    job_news.create_index([("dt_tm", ASCENDING)])
+    job_rollup.create_index([("grain", ASCENDING), ("scope", ASCENDING), ("key", ASCENDING), ("bucket", ASCENDING)])
+    job_rollup.create_index([("grain", ASCENDING), ("scope", ASCENDING), ("bucket", ASCENDING),
+                             ("sentiment.negative", DESCENDING), ("neg_impact_max", DESCENDING)])
+
+def run_pass(rebuild: bool = False, batch: int = 1000, log=print) -> int:
+    """One pass from the checkpoint (minus the overlap); returns how many announcements were new."""
+    if rebuild:
+        job_rollup.delete_many({})
+        col_rollup_state.delete_one({"_id": CHECKPOINT_ID})
+        log("rebuilding rollups")
+    cp = col_rollup_state.find_one({"_id": CHECKPOINT_ID}) or {}
+    since: Optional[datetime] = cp.get("inserted_at")
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    checkpoint = since
+    last_id = ObjectId.from_datetime(since - timedelta(seconds=OVERLAP_S)) if since else None
+    done = new = 0
+    while True:
+        q = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = list(job_news.find(q, PROJECTION).sort("_id", ASCENDING).limit(batch))
+        if not docs:
+            break
+        ops = bucket_replacements(docs)
+        if ops:
+            job_rollup.bulk_write(ops, ordered=False)
+        last_id = docs[-1]["_id"]
+        done += len(docs)
+        new += sum(1 for d in docs if checkpoint is None or d["_id"].generation_time > checkpoint)
+        newest = max(d["_id"].generation_time for d in docs)
+        if since is None or newest > since:
+            since = newest
+        col_rollup_state.replace_one(
+            {"_id": CHECKPOINT_ID},
+            {"_id": CHECKPOINT_ID, "inserted_at": since, "saved_at": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+        log(f"  {done} announcements, {len(ops)} buckets in last batch")
+    return new
+
+# -------------------- READS --------------------
+def trend(scope: str, key: str, grain: str = "day", days: int = 90) -> List[Dict[str, Any]]:
+    """Buckets for one company / category over the last `days`, oldest first."""
+    since = _day(datetime.now()) - timedelta(days=days)
+    if grain == "week":
+        since = week_start(since)
+    return breakers["news"].call(lambda: list(
+        col_rollup.find({"grain": grain, "scope": scope, "key": key, "bucket": {"$gte": since}},
+                        {"_id": 0}).sort("bucket", ASCENDING).max_time_ms(QUERY_MAX_TIME_MS)))
+
+def most_negative(scope: str = "company", week: Optional[datetime] = None, limit: int = 10) -> List[Dict[str, Any]]:
+    """Weekly buckets ranked by negative announcements, then their highest impact score."""
+    day = _day(week or datetime.now())
+    return breakers["news"].call(lambda: list(
+        col_rollup.find({"grain": "week", "scope": scope, "bucket": week_start(day), "sentiment.negative": {"$gt": 0}},
+                        {"_id": 0})
+        .sort([("sentiment.negative", DESCENDING), ("neg_impact_max", DESCENDING)])
+        .limit(limit).max_time_ms(QUERY_MAX_TIME_MS)))
+
+def mean_impact(b: Dict[str, Any]) -> Optional[float]:
+    return b["impact_sum"] / b["impact_n"] if b.get("impact_n") else None
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rebuild", action="store_true", help="drop all rollups and recompute from scratch")
+    ap.add_argument("--batch", type=int, default=1000)
+    ap.add_argument("--follow", type=float, metavar="SECONDS", help="repeat incremental passes at this interval")
+    args = ap.parse_args()
+
+    ensure_indexes()
+    n = run_pass(rebuild=args.rebuild, batch=args.batch)
+    print(f"rolled up {n} announcements into {ROLLUP_COLL}")
+    while args.follow:
+        time.sleep(args.follow)
+        n = run_pass(batch=args.batch, log=lambda *_: None)
+        if n:
+            print(f"rolled up {n} new announcements")
+
+if __name__ == "__main__":
+    sys.exit(main())
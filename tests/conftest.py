@@ -0,0 +1,5 @@
+# tests/conftest.py
+# The modules under test live at the repo root (like bench/, which also puts the root on sys.path).
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+# tests/test_api.py
+import api
+from data import Company, SourceUnavailable
+
+TCS = Company("TCS", 532540, "Tata Consultancy Services", "INE467B01029", 3)
+
+def _setup(monkeypatch, news):
+    monkeypatch.setattr(api, "resolve_company", lambda cid: TCS if cid.upper() in ("TCS", "532540") else None)
+    monkeypatch.setattr(api, "fetch_actual_docs", lambda opt, limit: news[:limit])
+
+def test_render_section_and_errors(monkeypatch):
+    _setup(monkeypatch, [{"_id": 1, "title": "a"}])
+    r = api.render("/companies/tcs/news", {})
+    assert r.status == 200 and r.cacheable and r.body == b'[{"_id": 1, "title": "a"}]'
+    assert api.render("/companies/nope", {}).status == 404
+    assert api.render("/companies/tcs/bogus", {}).status == 404
+    assert api.render("/companies/tcs", {"sections": ["news,bogus"]}).status == 400
+    assert api.render("/bulk", {}).status == 400
+
+def test_etag_is_weak_and_tracks_every_doc(monkeypatch):
+    news = [{"_id": 2, "title": "new"}, {"_id": 1, "title": "old"}]
+    _setup(monkeypatch, news)
+    first = api.render("/companies/TCS/news", {})
+    assert first.etag.startswith('W/"') and first.etag == api.render("/companies/TCS/news", {}).etag
+    news[1] = {"_id": 1, "title": "old, edited"}
+    assert api.render("/companies/TCS/news", {}).etag != first.etag
+    assert api._weak(first.etag) == api._weak(first.etag.removeprefix("W/"))
+
+def test_degraded_responses_are_not_cached(monkeypatch):
+    _setup(monkeypatch, [])
+    def down(opt, limit):
+        raise SourceUnavailable("news", "circuit open")
+    monkeypatch.setattr(api, "fetch_actual_docs", down)
+    assert api.render("/companies/TCS/news", {}).status == 503
+    r = api.render("/bulk", {"ids": ["TCS,NOPE"], "section": ["news"]})
+    assert r.status == 200 and not r.cacheable
+    assert b'"NOPE": null' in r.body and b'"errors"' in r.body
+
+def test_non_loopback_bind_requires_token(monkeypatch):
+    monkeypatch.setattr(api, "API_TOKEN", "")
+    assert api._is_loopback("127.0.0.1") and api._is_loopback("::1") and api._is_loopback("localhost")
+    assert not api._is_loopback("0.0.0.0")
+    try:
+        api.serve("0.0.0.0", 0)
+    except SystemExit as e:
+        assert "API_TOKEN" in str(e)
+    else:
+        raise AssertionError("serve() bound without a token")
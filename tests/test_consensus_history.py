@@ -0,0 +1,42 @@
+# tests/test_consensus_history.py
+from datetime import datetime
+
+import consensus_history
+from consensus_history import series_updates, snapshot
+
+def preview(updated_at, sales, n=2):
+    return {"company_id": "TCS", "symbolmap": {"NSE": "TCS", "BSE": 532540}, "report_period": "Q1FY26",
+            "updated_at": updated_at, "consensus": {"expected_sales": {"mean": sales}},
+            "broker_estimates": [{}] * n}
+
+class _History:
+    def __init__(self, docs): self.docs = docs
+    def find(self, flt, projection=None):
+        ids = flt["_id"]["$in"]
+        return [d for d in self.docs if d["_id"] in ids]
+
+def test_snapshot_normalizes_time_and_skips_empty_consensus():
+    pt = snapshot(preview("2025-07-01T10:00:00+05:30", 100))
+    assert pt["t"] == datetime(2025, 7, 1, 4, 30) and pt["s"] == 100.0 and pt["n"] == 2
+    assert snapshot({"updated_at": "2025-07-01", "consensus": {}}) is None
+
+def test_series_updates_stores_only_changes(monkeypatch):
+    monkeypatch.setattr(consensus_history, "job_history", _History([
+        {"_id": "TCS|Q1FY26", "points": [snapshot(preview("2025-07-01T00:00:00", 100))]},
+    ]))
+    ops = series_updates([
+        preview("2025-07-01T00:00:00", 100),   # already stored
+        preview("2025-07-02T00:00:00", 100),   # same as predecessor
+        preview("2025-07-03T00:00:00", 110),   # changed
+        preview("2025-07-04T00:00:00", 110, n=3),
+    ])
+    assert len(ops) == 1
+    op = ops[0]._doc
+    assert ops[0]._filter == {"_id": "TCS|Q1FY26"}
+    assert [p["t"].day for p in op["$push"]["points"]["$each"]] == [3, 4]
+    assert op["$max"]["last_t"] == datetime(2025, 7, 4)
+    assert op["$addToSet"]["keys"]["$each"] == ["TCS", "532540"]
+
+def test_series_updates_nothing_new(monkeypatch):
+    monkeypatch.setattr(consensus_history, "job_history", _History([]))
+    assert series_updates([{"company_id": "TCS", "consensus": {}}]) == []
@@ -0,0 +1,211 @@
+# tests/test_data.py
+import threading, time
+
+import pytest
+from pymongo.errors import AutoReconnect, NetworkTimeout, OperationFailure
+
+import data
+from data import (
+    CircuitBreaker, Company, CompanyDirectory, RefreshingValue, SourceUnavailable, TTLCache, checkpoint_filter,
+)
+
+def _raise(exc):
+    def fn():
+        raise exc
+    return fn
+
+# -------------------- CircuitBreaker --------------------
+def test_breaker_opens_after_consecutive_transient_errors():
+    b = CircuitBreaker("t", max_failures=2, reset_after=60)
+    for _ in range(2):
+        with pytest.raises(SourceUnavailable):
+            b.call(_raise(NetworkTimeout("slow")))
+    assert b.is_open
+    calls = []
+    with pytest.raises(SourceUnavailable, match="circuit open"):
+        b.call(lambda: calls.append(1))
+    assert calls == []
+
+def test_breaker_ignores_non_transient_errors():
+    b = CircuitBreaker("t", max_failures=1, reset_after=60)
+    with pytest.raises(SourceUnavailable):
+        b.call(_raise(OperationFailure("bad query")))
+    assert not b.is_open
+    assert b.call(lambda: 42) == 42
+
+def test_breaker_success_resets_count_and_half_open_trial():
+    b = CircuitBreaker("t", max_failures=2, reset_after=0.05)
+    with pytest.raises(SourceUnavailable):
+        b.call(_raise(AutoReconnect("down")))
+    assert b.call(lambda: "ok") == "ok"
+    with pytest.raises(SourceUnavailable):
+        b.call(_raise(AutoReconnect("down")))
+    assert not b.is_open  # one failure since the last success
+
+    with pytest.raises(SourceUnavailable):
+        b.call(_raise(AutoReconnect("down")))
+    assert b.is_open
+    time.sleep(0.06)
+    assert b.call(lambda: "back") == "back"
+    assert not b.is_open
+
+def _opened(reset_after=0.05):
+    b = CircuitBreaker("t", max_failures=1, reset_after=reset_after)
+    with pytest.raises(SourceUnavailable):
+        b.call(_raise(NetworkTimeout("slow")))
+    time.sleep(reset_after + 0.01)
+    return b
+
+def test_half_open_admits_a_single_trial():
+    b = _opened()
+    started, release, calls = threading.Event(), threading.Event(), []
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return "ok"
+    trial = threading.Thread(target=lambda: b.call(slow))
+    trial.start()
+    started.wait(1)
+    assert b.is_open
+    refused = []
+    def other():
+        try: b.call(lambda: calls.append(1))
+        except SourceUnavailable as e: refused.append(str(e))
+    others = [threading.Thread(target=other) for _ in range(8)]
+    for t in others: t.start()
+    for t in others: t.join()
+    assert len(calls) == 1 and refused == ["t unavailable (circuit open)"] * 8
+    release.set()
+    trial.join()
+    assert not b.is_open and b.call(lambda: "closed") == "closed"
+
+def test_failed_trial_reopens_at_once():
+    b = _opened()
+    b.max_failures = 3
+    with pytest.raises(SourceUnavailable, match="AutoReconnect"):
+        b.call(_raise(AutoReconnect("down")))
+    assert b.is_open
+    with pytest.raises(SourceUnavailable, match="circuit open"):
+        b.call(lambda: "ok")
+
+def test_trial_that_raises_elsewhere_frees_the_slot():
+    b = _opened()
+    with pytest.raises(KeyError):
+        b.call(_raise(KeyError("bug")))
+    assert b.call(lambda: "ok") == "ok" and not b.is_open
+
+# -------------------- TTLCache --------------------
+def test_ttl_cache_expires():
+    c = TTLCache(ttl=0.05)
+    c.set("k", 1)
+    assert c.get("k") == 1
+    time.sleep(0.06)
+    assert c.get("k", "gone") == "gone"
+
+def test_ttl_cache_evicts_entry_closest_to_expiry():
+    c = TTLCache(ttl=60, maxsize=2)
+    c.set("a", 1, ttl=1)
+    c.set("b", 2)
+    c.set("c", 3)
+    assert c.get("a") is None and c.get("b") == 2 and c.get("c") == 3
+
+def test_get_or_set_is_single_flight():
+    c = TTLCache(ttl=60)
+    calls, gate = [], threading.Event()
+    def factory():
+        calls.append(1)
+        gate.wait(1)
+        return "v"
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(c.get_or_set("k", factory))) for _ in range(8)]
+    for t in threads: t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads: t.join()
+    assert out == ["v"] * 8 and len(calls) == 1
+
+def test_get_or_set_does_not_cache_failures():
+    c = TTLCache(ttl=60)
+    with pytest.raises(ValueError):
+        c.get_or_set("k", _raise(ValueError()))
+    assert c.get_or_set("k", lambda: 1) == 1
+
+# -------------------- RefreshingValue --------------------
+def test_refreshing_value_serves_stale_while_rebuilding():
+    builds, gate = [], threading.Event()
+    def factory():
+        builds.append(1)
+        if len(builds) > 1:
+            gate.wait(1)
+        return len(builds)
+    v = RefreshingValue(factory, ttl=0.01)
+    assert v.peek() is None
+    assert v.get() == 1
+    time.sleep(0.02)
+    assert v.get() == 1          # stale value served, rebuild started
+    assert v.get() == 1          # no second rebuild while one is running
+    gate.set()
+    for _ in range(100):
+        if v.peek() == 2: break
+        time.sleep(0.01)
+    assert v.peek() == 2 and len(builds) == 2
+
+# -------------------- checkpoint_filter --------------------
+def test_checkpoint_filter():
+    assert checkpoint_filter(None) == {}
+    assert checkpoint_filter({"updated_at": "2025-07-01", "last_id": 5}) == {"$or": [
+        {"updated_at": {"$gt": "2025-07-01"}},
+        {"updated_at": "2025-07-01", "_id": {"$gt": 5}},
+    ]}
+    assert checkpoint_filter({"updated_at": None, "last_id": 5}) == {"$or": [
+        {"updated_at": {"$ne": None}},
+        {"updated_at": None, "_id": {"$gt": 5}},
+    ]}
+
+# -------------------- CompanyDirectory --------------------
+def test_directory_merges_duplicate_ids():
+    d = CompanyDirectory([
+        Company("TCS", 532540, "Tata Consultancy Services", "INE467B01029", 3),
+        Company("INFY", None, "Infosys", None, 1),
+        Company("tcs ", None, "TCS Ltd", None, 2),     # same NSE symbol, other metadata
+    ])
+    assert d.ids == ("TCS", "INFY")
+    tcs = d["TCS"]
+    assert tcs.count == 5 and tcs.name == "Tata Consultancy Services" and tcs.label.endswith("(5)")
+    assert d.lookup("532540") is tcs and d.lookup("tata consultancy services") is tcs
+    assert d.lookup("TCS Ltd") is tcs
+
+# -------------------- find_company --------------------
+class _News:
+    """Just enough of a collection for find_company: records every query it is sent."""
+    def __init__(self, names):
+        self.names, self.calls = names, []
+    def aggregate(self, pipeline, maxTimeMS=None):
+        match = pipeline[0]["$match"]
+        self.calls.append(("aggregate", match))
+        name = match.get("symbolmap.Company_Name")
+        if name in self.names:
+            return [{"_id": {"nse": "TCS", "bse": 532540, "name": name, "isin": "INE467B01029"}, "count": 4}]
+        if any(c.get("symbolmap.NSE") == "TCS" for c in match.get("$or", [])):
+            return [{"_id": {"nse": "TCS", "bse": 532540, "name": self.names[0], "isin": "INE467B01029"}, "count": 4}]
+        return []
+    def find_one(self, flt, projection=None, collation=None, **kw):
+        self.calls.append(("find_one", flt, collation))
+        q = flt["symbolmap.Company_Name"]
+        hit = next((n for n in self.names if collation and n.lower() == q.lower()), None)
+        return {"symbolmap": {"Company_Name": hit}} if hit else None
+
+def test_find_company_tries_codes_before_the_name(monkeypatch):
+    news = _News(["Tata Consultancy Services"])
+    monkeypatch.setattr(data, "col_news", news)
+    assert data.find_company(" tcs ").id == "TCS"
+    assert news.calls == [("aggregate", {"$or": [{"symbolmap.NSE": "TCS"}, {"company": "TCS"}]})]
+
+    news.calls.clear()
+    assert data.find_company("tata consultancy SERVICES").id == "TCS"
+    assert news.calls[1] == ("find_one", {"symbolmap.Company_Name": "tata consultancy SERVICES"}, data.NAME_COLLATION)
+    assert news.calls[2] == ("aggregate", {"symbolmap.Company_Name": "Tata Consultancy Services"})
+    assert not any("$regex" in str(c) for c in news.calls)
+
+    assert data.find_company("nobody") is None
@@ -0,0 +1,52 @@
+# tests/test_rollups.py
+from datetime import datetime
+
+import rollups
+from rollups import fold, week_start
+
+def test_fold_builds_complete_day_and_week_buckets():
+    docs = [
+        {"dt_tm": "2025-07-02 10:00:00", "sentiment": "Negative", "impactscore": "7",
+         "category": "Results", "symbolmap": {"NSE": "tcs "}},
+        {"dt_tm": datetime(2025, 7, 2, 15), "sentiment": "positive", "impactscore": 3,
+         "category": "Results", "company": "INE467B01029"},
+        {"dt_tm": "2025-07-04", "sentiment": None, "impactscore": None, "symbolmap": {"NSE": "TCS"}},
+        {"dt_tm": "not a date", "symbolmap": {"NSE": "TCS"}},
+    ]
+    out = fold(docs)
+    wed, week = datetime(2025, 7, 2), week_start(datetime(2025, 7, 2))
+    assert week == datetime(2025, 6, 30)
+
+    day = out[("day", "company", "TCS", wed)]
+    assert day["_id"] == "day|company|TCS|2025-07-02"
+    assert day["n"] == 1 and day["sentiment"] == {"positive": 0, "negative": 1, "neutral": 0, "other": 0}
+    assert day["impact_max"] == day["neg_impact_max"] == 7.0
+
+    tcs_week = out[("week", "company", "TCS", week)]
+    assert tcs_week["n"] == 2 and tcs_week["impact_n"] == 1 and tcs_week["sentiment"]["other"] == 1
+
+    results = out[("day", "category", "Results", wed)]
+    assert results["n"] == 2 and results["impact_sum"] == 10.0 and results["neg_impact_sum"] == 7.0
+    assert out[("week", "category", "Uncategorized", week)]["n"] == 1
+
+def test_fold_is_deterministic():
+    docs = [{"dt_tm": "2025-07-02", "sentiment": "neutral", "impactscore": 1, "symbolmap": {"NSE": "INFY"}}] * 3
+    assert fold(docs) == fold(list(docs))
+    assert fold(docs)[("day", "company", "INFY", datetime(2025, 7, 2))]["n"] == 3
+
+def test_source_docs_reads_only_touched_weeks(monkeypatch):
+    seen = []
+    class _News:
+        def aggregate(self, pipeline):
+            seen.append(pipeline)
+            return iter([])
+    monkeypatch.setattr(rollups, "job_news", _News())
+    touched = fold([
+        {"dt_tm": "2025-07-02", "symbolmap": {"NSE": "TCS"}, "category": "Results"},
+        {"dt_tm": "2019-03-05", "symbolmap": {"NSE": "INFY"}},            # back-dated
+    ]).keys()
+    list(rollups._source_docs(touched))
+    ranges = [c["dt_tm"] for c in seen[0][0]["$match"]["$or"]]
+    assert [r for r in ranges if isinstance(r["$gte"], str)] == [
+        {"$gte": "2019-03-04", "$lt": "2019-03-11"}, {"$gte": "2025-06-30", "$lt": "2025-07-07"}]
+    assert seen[0][2]["$match"]["$or"][0] == {"_cid": {"$in": ["INFY", "TCS"]}}
@@ -0,0 +1,31 @@
+# watchlists.py
+"""
+Persistent per-user watchlists: one doc per user in WATCHLIST_COLLECTION (in DB_NAME).
+
+    {_id: username, companies: [directory IDs, in the order they were added], updated_at}
+
+Reads and writes go to the primary, so a company added on one rerun is there on the next.
+The watchlist page loads every watched company's latest news with one aggregation
+(data.fetch_latest_news_by_company).
+"""
+import os
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo import ReadPreference
+
+from data import QUERY_MAX_TIME_MS, breakers, db_news
+
+WATCHLIST_COLL = os.getenv("WATCHLIST_COLLECTION", "watchlists")
+col_watchlists = db_news[WATCHLIST_COLL].with_options(read_preference=ReadPreference.PRIMARY)
+
+def get_watchlist(user: str) -> List[str]:
+    doc = breakers["news"].call(lambda: col_watchlists.find_one(
+        {"_id": user}, {"companies": 1}, max_time_ms=QUERY_MAX_TIME_MS))
+    return list((doc or {}).get("companies") or [])
+
+def set_watchlist(user: str, company_ids: List[str]) -> List[str]:
+    """Replace the user's watchlist (duplicates dropped, order kept) and return it as stored."""
+    update = {"$set": {"companies": list(dict.fromkeys(company_ids)), "updated_at": datetime.now(timezone.utc)}}
+    breakers["news"].call(lambda: col_watchlists.update_one({"_id": user}, update, upsert=True))
+    return get_watchlist(user)